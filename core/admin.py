@@ -5,13 +5,39 @@ from django.contrib import admin
 Administration Django pour l'application e-commerce
 """
 
-from django.contrib import admin
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from django.views.decorators.http import require_POST
 from .models import (
     User, Category, Product, ProductImage, 
-    Cart, CartItem, Order, OrderItem, UserProfile
+    Cart, CartItem, Order, OrderItem, OrderStatusHistory, UserProfile, CustomerStats
 )
+from .cart import CENTS, line_total_expression
+from .customer_stats import record_order_placed, record_status_changes
+from .dashboard import refresh_admin_stats
+from .exports import export_response
+from .inventory import restock_orders
+from .order_numbers import next_order_number
+from .order_status import record_history, transition_orders
+from .outbox import record_order_created, record_status_change
+from .sales import (
+    record_order_sales, record_sales_status_changes, sales_series, top_categories, top_products,
+)
+
+# Périodes proposées par le tableau des ventes (jours)
+SALES_PERIODS = (7, 30, 90, 365)
 
 
 # ==================== USER ADMIN ====================
@@ -62,9 +88,14 @@ class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     inlines = [ProductInline]
     
+    def get_queryset(self, request):
+        # Nombre de produits calculé en SQL pour toute la page (colonne triable)
+        return super().get_queryset(request).annotate(product_total=Count('products'))
+    
     def product_count(self, obj):
-        return obj.products.count()
+        return obj.product_total
     product_count.short_description = _('Nombre de produits')
+    product_count.admin_order_field = 'product_total'
 
 
 # ==================== PRODUCT ADMIN ====================
@@ -81,6 +112,7 @@ class ProductAdmin(admin.ModelAdmin):
     """Administration pour les produits"""
     
     list_display = ('name', 'category', 'price', 'discount_price', 'stock', 'is_available', 'created_at')
+    list_select_related = ('category',)
     list_filter = ('category', 'is_available', 'created_at')
     search_fields = ('name', 'description', 'brand')
     list_editable = ('price', 'stock', 'is_available')
@@ -128,6 +160,9 @@ class CartItemInline(admin.TabularInline):
     fields = ('product', 'quantity', 'total_price_display')
     readonly_fields = ('total_price_display',)
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+    
     def total_price_display(self, obj):
         return f"{obj.total_price} €"
     total_price_display.short_description = _('Prix total')
@@ -138,6 +173,7 @@ class CartAdmin(admin.ModelAdmin):
     """Administration pour les paniers"""
     
     list_display = ('id', 'user_display', 'session_key', 'total_items', 'total_price_display', 'created_at')
+    list_select_related = ('user',)
     list_filter = ('created_at',)
     search_fields = ('user__username', 'session_key')
     readonly_fields = ('created_at', 'updated_at')
@@ -153,17 +189,30 @@ class CartAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # Articles et montant agrégés en SQL pour toute la page (colonnes triables)
+        return super().get_queryset(request).annotate(
+            item_total=Coalesce(Sum('items__quantity'), 0),
+            price_total=Coalesce(
+                Sum(line_total_expression('items__'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+                Value(Decimal('0')),
+            ),
+        )
+    
     def user_display(self, obj):
         return obj.user.username if obj.user else _('Anonyme')
     user_display.short_description = _('Utilisateur')
+    user_display.admin_order_field = 'user__username'
     
     def total_price_display(self, obj):
-        return f"{obj.total_price} €"
+        return f"{obj.price_total.quantize(CENTS)} €"
     total_price_display.short_description = _('Total panier')
+    total_price_display.admin_order_field = 'price_total'
     
     def total_items(self, obj):
-        return obj.total_items
+        return obj.item_total
     total_items.short_description = _('Articles')
+    total_items.admin_order_field = 'item_total'
 
 
 # ==================== ORDER ADMIN ====================
@@ -175,25 +224,46 @@ class OrderItemInline(admin.TabularInline):
     fields = ('product', 'quantity', 'price', 'total_price_display')
     readonly_fields = ('total_price_display',)
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+    
     def total_price_display(self, obj):
+        if obj.pk is None:  # ligne vide du formulaire d'ajout
+            return '-'
         return f"{obj.total_price} €"
     total_price_display.short_description = _('Sous-total')
 
 
+class OrderStatusHistoryInline(admin.TabularInline):
+    """Historique des statuts (lecture seule)"""
+    model = OrderStatusHistory
+    extra = 0
+    can_delete = False
+    fields = ('created_at', 'from_status', 'to_status', 'changed_by', 'source')
+    readonly_fields = fields
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('changed_by')
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """Administration pour les commandes"""
     
     list_display = ('order_number', 'user', 'status', 'total_amount', 'payment_method', 'created_at')
+    list_select_related = ('user',)
     list_filter = ('status', 'payment_method', 'created_at')
     search_fields = ('order_number', 'user__username', 'user__email')
     list_editable = ('status',)
-    readonly_fields = ('order_number', 'created_at', 'updated_at')
-    inlines = [OrderItemInline]
+    readonly_fields = ('order_number', 'stock_status', 'created_at', 'updated_at')
+    inlines = [OrderItemInline, OrderStatusHistoryInline]
     
     fieldsets = (
         (_('Informations commande'), {
-            'fields': ('order_number', 'user', 'status', 'total_amount', 'payment_method')
+            'fields': ('order_number', 'user', 'status', 'stock_status', 'total_amount', 'payment_method')
         }),
         (_('Adresses'), {
             'fields': ('shipping_address', 'billing_address')
@@ -208,27 +278,135 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
     
-    actions = ['mark_as_processing', 'mark_as_shipped', 'mark_as_delivered', 'mark_as_cancelled']
+    actions = [
+        'mark_as_processing', 'mark_as_shipped', 'mark_as_delivered', 'mark_as_cancelled',
+        'export_orders_csv', 'export_lines_csv', 'export_orders_jsonl', 'export_lines_jsonl',
+    ]
+    
+    def save_model(self, request, obj, form, change):
+        # Formulaire ou édition en liste : correction manuelle, hors machine à
+        # états, mais tracée dans l'historique, l'outbox et les statistiques
+        if not obj.order_number:  # champ en lecture seule : numéroté comme au paiement
+            obj.order_number = next_order_number()
+        super().save_model(request, obj, form, change)
+        if not change:
+            record_order_placed(obj)
+            # Appliqué au commit, une fois les lignes de l'inline enregistrées
+            record_order_sales(obj)
+        elif 'status' in form.changed_data:
+            previous_status = form.initial.get('status')
+            record_history(
+                [{'id': obj.pk, 'status': previous_status}], obj.status,
+                changed_by=request.user, source='admin',
+            )
+            record_status_change(obj, previous_status)
+            record_status_changes([(obj.user_id, previous_status, obj.total_amount)], obj.status)
+            record_sales_status_changes([(obj.pk, previous_status)], obj.status)
+            # Commandes saisies ici : stock non suivi, restock_orders les ignore
+            if (obj.status == 'cancelled') != (previous_status == 'cancelled'):
+                restock_orders([obj.pk], withdraw=previous_status == 'cancelled')
+                obj.refresh_from_db(fields=['stock_status'])
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if not change:
+            # Après l'enregistrement des lignes (inline) : l'événement les contient
+            record_order_created(form.instance)
+    
+    def _transition(self, request, queryset, status):
+        report = transition_orders(queryset, status, changed_by=request.user, source='admin')
+        label = dict(Order.STATUS_CHOICES)[status]
+        self.message_user(request, _('%(count)s commande(s) passée(s) en "%(label)s" (%(batches)s lot(s)).') % {
+            'count': report.updated, 'label': label, 'batches': len(report.batches),
+        })
+        if report.skipped:
+            self.message_user(request, _(
+                '%(count)s commande(s) ignorée(s) : transition vers "%(label)s" non autorisée.'
+            ) % {'count': report.skipped, 'label': label}, messages.WARNING)
     
     def mark_as_processing(self, request, queryset):
-        queryset.update(status='processing')
-        self.message_user(request, _('Commandes marquées comme "En traitement".'))
+        self._transition(request, queryset, 'processing')
     mark_as_processing.short_description = _('Marquer comme "En traitement"')
     
     def mark_as_shipped(self, request, queryset):
-        queryset.update(status='shipped')
-        self.message_user(request, _('Commandes marquées comme "Expédiées".'))
+        self._transition(request, queryset, 'shipped')
     mark_as_shipped.short_description = _('Marquer comme "Expédiées"')
     
     def mark_as_delivered(self, request, queryset):
-        queryset.update(status='delivered')
-        self.message_user(request, _('Commandes marquées comme "Livrées".'))
+        self._transition(request, queryset, 'delivered')
     mark_as_delivered.short_description = _('Marquer comme "Livrées"')
     
     def mark_as_cancelled(self, request, queryset):
-        queryset.update(status='cancelled')
-        self.message_user(request, _('Commandes marquées comme "Annulées".'))
+        self._transition(request, queryset, 'cancelled')
     mark_as_cancelled.short_description = _('Marquer comme "Annulées"')
+    
+    # Exports en flux : la sélection (ou « tout sélectionner » avec les
+    # filtres de la liste) est relue par morceaux, sans charger d'objets
+    def export_orders_csv(self, request, queryset):
+        return export_response(queryset, 'csv')
+    export_orders_csv.short_description = _('Exporter les commandes (CSV)')
+    
+    def export_lines_csv(self, request, queryset):
+        return export_response(queryset, 'csv', lines=True)
+    export_lines_csv.short_description = _('Exporter les lignes de commande (CSV)')
+    
+    def export_orders_jsonl(self, request, queryset):
+        return export_response(queryset, 'jsonl')
+    export_orders_jsonl.short_description = _('Exporter les commandes (JSONL)')
+    
+    def export_lines_jsonl(self, request, queryset):
+        return export_response(queryset, 'jsonl', lines=True)
+    export_lines_jsonl.short_description = _('Exporter les lignes de commande (JSONL)')
+    
+    # Tableau de bord : statistiques et ventes, réservés aux comptes qui
+    # peuvent consulter les commandes (core.view_order)
+    def get_urls(self):
+        return [
+            path('stats/refresh/', self.admin_site.admin_view(require_POST(self.refresh_stats_view)),
+                 name='stats_refresh'),
+            path('sales/', self.admin_site.admin_view(self.sales_dashboard_view), name='sales_dashboard'),
+        ] + super().get_urls()
+    
+    def refresh_stats_view(self, request):
+        """Recalcule immédiatement l'instantané des statistiques du tableau de bord"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        refresh_admin_stats()
+        messages.success(request, _('Statistiques actualisées.'))
+        return redirect('admin:index')
+    
+    def sales_dashboard_view(self, request):
+        """Ventes de la période : série journalière et meilleures ventes, lues dans les cumuls"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            days = int(request.GET.get('days', getattr(settings, 'SALES_DASHBOARD_DAYS', 30)))
+        except ValueError:
+            days = 30
+        days = min(max(days, 1), 366)
+        date_to = timezone.localdate()
+        date_from = date_to - timedelta(days=days - 1)
+        
+        series = sales_series(date_from, date_to)
+        peak = max(row['revenue'] for row in series) or 1
+        for row in series:
+            row['share'] = int(row['revenue'] * 100 / peak)
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'title': _('Ventes'),
+            'days': days,
+            'periods': SALES_PERIODS,
+            'date_from': date_from,
+            'date_to': date_to,
+            'series': series,
+            'total_revenue': sum(row['revenue'] for row in series),
+            'total_orders': sum(row['order_count'] for row in series),
+            'total_units': sum(row['units'] for row in series),
+            'top_products': top_products(date_from, date_to),
+            'top_categories': top_categories(date_from, date_to),
+        }
+        return TemplateResponse(request, 'admin/sales_dashboard.html', context)
 
 
 # ==================== USER PROFILE ADMIN ====================
@@ -264,6 +442,28 @@ class UserProfileAdmin(admin.ModelAdmin):
     )
 
 
+# ==================== CUSTOMER STATS ADMIN ====================
+
+@admin.register(CustomerStats)
+class CustomerStatsAdmin(admin.ModelAdmin):
+    """Statistiques clients (lecture seule, tenues à jour par core.customer_stats)"""
+    
+    list_display = ('user', 'order_count', 'total_ordered', 'delivered_count', 'lifetime_spend', 'last_order_at')
+    list_select_related = ('user',)
+    search_fields = ('user__username', 'user__email')
+    ordering = ('-lifetime_spend',)
+    readonly_fields = (
+        'user', 'order_count', 'total_ordered', 'delivered_count',
+        'lifetime_spend', 'last_order_at', 'updated_at',
+    )
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # ==================== OTHER MODELS ====================
 
 @admin.register(ProductImage)
@@ -281,6 +481,7 @@ class CartItemAdmin(admin.ModelAdmin):
     """Administration pour les articles du panier"""
     
     list_display = ('cart', 'product', 'quantity', 'total_price_display', 'added_at')
+    list_select_related = ('cart__user', 'product')
     list_filter = ('added_at',)
     search_fields = ('cart__session_key', 'product__name')
     
@@ -294,6 +495,7 @@ class OrderItemAdmin(admin.ModelAdmin):
     """Administration pour les articles de commande"""
     
     list_display = ('order', 'product', 'quantity', 'price', 'total_price_display', 'created_at')
+    list_select_related = ('order__user', 'product')
     list_filter = ('created_at',)
     search_fields = ('order__order_number', 'product__name')
     
@@ -310,4 +512,4 @@ admin.site.site_title = _('Nexus Shop Admin')
 admin.site.index_title = _('Tableau de bord')
 
 # Organisation des modèles dans l'admin
-admin.site.index_template = 'admin/custom_index.html'
\ No newline at end of file
+admin.site.index_template = 'admin/custom_index.html'
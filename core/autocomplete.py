@@ -0,0 +1,163 @@
+"""
+Index d'autocomplétion en mémoire (noms de produits, marques, catégories)
+
+L'index est un tableau trié de clés normalisées (minuscules, sans accents)
+interrogé par bisect : une recherche de préfixe coûte O(log n + k). Chaque
+mot d'un libellé est indexé, « fil » trouve donc « Écouteurs sans fil ».
+
+L'index est construit une fois par processus puis reconstruit en tâche de
+fond lorsque la version du catalogue (core.caching) change, ou au plus tard
+AUTOCOMPLETE_INDEX_TTL secondes après sa construction : avec un cache non
+partagé (LocMemCache), la version vue par un processus ignore les
+modifications faites dans les autres. L'ancien index continue de répondre
+pendant la reconstruction.
+"""
+
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+
+from .caching import get_catalog_version
+from .models import Category, Product
+
+# Ordre d'affichage des types de suggestions
+KIND_PRIORITY = {'category': 0, 'brand': 1, 'product': 2}
+
+# Nombre maximum de clés parcourues pour un préfixe très court
+MAX_SCAN = 500
+
+# Âge maximal de l'index, quelle que soit la version du catalogue (secondes)
+DEFAULT_INDEX_TTL = 300
+
+
+def normalize(text):
+    """Minuscules sans accents : « Écouteurs » -> « ecouteurs »"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower().strip()
+
+
+class PrefixIndex:
+    """Tableau trié de (clé, suggestion) interrogé par préfixe"""
+
+    def __init__(self, suggestions, version=None):
+        self.version = version
+        self.built_at = time.monotonic()
+        entries = []
+        for suggestion in suggestions:
+            label = normalize(suggestion['label'])
+            words = label.split()
+            # Le libellé complet puis chaque suffixe commençant par un mot
+            for i in range(len(words)):
+                entries.append((' '.join(words[i:]), i, suggestion))
+        entries.sort(key=lambda entry: entry[0])
+        self.keys = [entry[0] for entry in entries]
+        self.entries = [(position, suggestion) for _key, position, suggestion in entries]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def complete(self, prefix, limit=8):
+        """Retourne au plus `limit` suggestions dont un mot commence par `prefix`"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        start = bisect_left(self.keys, prefix)
+        matches = {}
+        for i in range(start, min(start + MAX_SCAN, len(self.keys))):
+            if not self.keys[i].startswith(prefix):
+                break
+            position, suggestion = self.entries[i]
+            ident = (suggestion['type'], suggestion['label'])
+            rank = (position > 0, KIND_PRIORITY[suggestion['type']], len(suggestion['label']))
+            if ident not in matches or rank < matches[ident][0]:
+                matches[ident] = (rank, suggestion)
+
+        ranked = sorted(matches.values(), key=lambda match: match[0])
+        return [suggestion for _rank, suggestion in ranked[:limit]]
+
+
+def load_suggestions():
+    """Charge les libellés à indexer (deux requêtes, projections étroites)"""
+    suggestions = []
+    brands = set()
+    for name, slug, brand in Product.objects.filter(is_available=True).values_list(
+        'name', 'slug', 'brand'
+    ).iterator(chunk_size=2000):
+        suggestions.append({
+            'type': 'product',
+            'label': name,
+            'url': reverse('product_detail', args=[slug]),
+        })
+        if brand:
+            brands.add(brand)
+
+    search_url = reverse('search_view')
+    for brand in sorted(brands):
+        suggestions.append({
+            'type': 'brand',
+            'label': brand,
+            'url': f'{search_url}?{urlencode({"q": brand})}',
+        })
+
+    for name, slug in Category.objects.values_list('name', 'slug'):
+        suggestions.append({
+            'type': 'category',
+            'label': name,
+            'url': reverse('product_list_by_category', args=[slug]),
+        })
+    return suggestions
+
+
+class AutocompleteService:
+    """Index partagé par le processus, reconstruit paresseusement en tâche de fond"""
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def _build(self, version):
+        index = PrefixIndex(load_suggestions(), version)
+        self._index = index
+        return index
+
+    def _rebuild_in_background(self, version):
+        try:
+            self._build(version)
+        finally:
+            connection.close()
+            self._rebuilding = False
+
+    def get_index(self):
+        """Retourne l'index courant, en déclenchant une reconstruction s'il est périmé"""
+        version = get_catalog_version()
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    return self._build(version)
+                return self._index
+
+        ttl = getattr(settings, 'AUTOCOMPLETE_INDEX_TTL', DEFAULT_INDEX_TTL)
+        expired = time.monotonic() - index.built_at > ttl
+        if (index.version != version or expired) and not self._rebuilding:
+            with self._lock:
+                if not self._rebuilding:
+                    self._rebuilding = True
+                    threading.Thread(
+                        target=self._rebuild_in_background, args=(version,), daemon=True,
+                    ).start()
+        return index
+
+    def complete(self, prefix, limit=8):
+        return self.get_index().complete(prefix, limit)
+
+
+autocomplete_service = AutocompleteService()
@@ -0,0 +1,92 @@
+"""
+Cache versionné du catalogue
+
+Toutes les clés dérivées du catalogue (facettes, page d'accueil...) incluent
+un numéro de version ; modifier un produit ou une catégorie incrémente ce
+numéro, ce qui rend d'un coup toutes les anciennes entrées inaccessibles.
+Elles expirent ensuite d'elles-mêmes.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Durée maximale d'un recalcul avant que le verrou ne soit libéré d'office
+RECOMPUTE_LOCK_TIMEOUT = 30
+# Attente maximale d'un recalcul en cours avant de calculer soi-même
+RECOMPUTE_MAX_WAIT = 5.0
+
+_MISSING = object()
+
+
+def get_version(key):
+    """Retourne la valeur d'un compteur de version partagé (créé à 1)"""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(key):
+    """Incrémente un compteur de version partagé"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, get_version(key) + 1, None)
+
+
+def get_catalog_version():
+    """Retourne la version courante du catalogue"""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Invalide toutes les entrées de cache dérivées du catalogue"""
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def catalog_key(prefix, *parts):
+    """Construit une clé de cache liée à la version courante du catalogue"""
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'catalog:{get_catalog_version()}:{prefix}:{digest}'
+
+
+def get_or_compute(key, compute, timeout, stale_key=None):
+    """
+    Lit `key` en cache ou la recalcule sans effet de troupeau (single-flight)
+
+    Un seul processus obtient le verrou (cache.add est atomique) et recalcule
+    la valeur ; les autres servent la dernière valeur connue (`stale_key`,
+    conservée entre deux versions du catalogue) ou attendent le résultat.
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, RECOMPUTE_LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+            if stale_key:
+                cache.set(stale_key, value, None)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    if stale_key:
+        value = cache.get(stale_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+    deadline = time.monotonic() + RECOMPUTE_MAX_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+    return compute()
@@ -0,0 +1,487 @@
+"""
+Services du panier d'achat
+
+- Utilisateurs connectés : panier en base (Cart / CartItem).
+- Visiteurs anonymes : panier dans un cookie signé et borné (CookieCart),
+  sans session ni ligne en base ; il est fusionné dans le panier de
+  l'utilisateur à la connexion (voir core.signals).
+
+Le nombre d'articles affiché dans le badge du panier (base.html) est
+dénormalisé dans la session des utilisateurs connectés, et lu directement
+dans le cookie pour les anonymes : aucune requête SQL pour l'afficher.
+"""
+
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Least
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject, cached_property
+
+CART_COUNT_SESSION_KEY = 'cart_item_count'
+
+CENTS = Decimal('0.01')
+
+# Panier anonyme : cookie signé, borné en nombre de lignes et en quantité
+CART_COOKIE_NAME = 'cart'
+CART_COOKIE_SALT = 'core.cart'
+CART_COOKIE_MAX_AGE = 60 * 60 * 24 * 30  # 30 jours
+CART_COOKIE_MAX_LINES = 50
+CART_MAX_QUANTITY = 99
+
+
+# ==================== PANIER ANONYME (COOKIE) ====================
+
+class CookieCartItem:
+    """Ligne d'un panier anonyme ; `id` est l'id du produit"""
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+        self.id = product.pk
+
+    @property
+    def total_price(self):
+        return self.quantity * self.product.final_price
+
+
+class CookieCartItems(list):
+    """Liste de lignes chargées, avec l'interface `cart.items.all` des templates"""
+
+    def all(self):
+        return self
+
+    def count(self):
+        return len(self)
+
+
+class CookieCart:
+    """Panier d'un visiteur anonyme, sérialisé dans un cookie signé"""
+
+    is_cookie_cart = True
+
+    def __init__(self, lines=None):
+        # {product_id: quantité}, dans l'ordre d'ajout
+        self.lines = dict(lines or {})
+        self.modified = False
+        self._items = None
+
+    @classmethod
+    def from_request(cls, request):
+        value = request.get_signed_cookie(
+            CART_COOKIE_NAME, default=None, salt=CART_COOKIE_SALT, max_age=CART_COOKIE_MAX_AGE,
+        )
+        return cls(cls.parse(value) if value else None)
+
+    @staticmethod
+    def parse(value):
+        """'12:1,7:3' -> {12: 1, 7: 3} ; les entrées invalides sont ignorées"""
+        lines = {}
+        for chunk in value.split(',')[:CART_COOKIE_MAX_LINES]:
+            try:
+                product_id, quantity = (int(part) for part in chunk.split(':'))
+            except ValueError:
+                continue
+            if product_id > 0 and quantity > 0:
+                lines[product_id] = min(quantity, CART_MAX_QUANTITY)
+        return lines
+
+    def serialize(self):
+        return ','.join(f'{product_id}:{quantity}' for product_id, quantity in self.lines.items())
+
+    def _changed(self):
+        self.modified = True
+        self._items = None
+
+    def add(self, product_id, quantity=1):
+        """Ajoute un produit ; False si le panier est plein"""
+        if product_id not in self.lines and len(self.lines) >= CART_COOKIE_MAX_LINES:
+            return False
+        self.lines[product_id] = min(self.lines.get(product_id, 0) + quantity, CART_MAX_QUANTITY)
+        self._changed()
+        return True
+
+    def set_quantity(self, product_id, quantity):
+        """Fixe la quantité d'une ligne existante (0 la supprime)"""
+        if product_id not in self.lines:
+            return False
+        if quantity > 0:
+            self.lines[product_id] = min(quantity, CART_MAX_QUANTITY)
+        else:
+            del self.lines[product_id]
+        self._changed()
+        return True
+
+    def remove(self, product_id):
+        return self.set_quantity(product_id, 0)
+
+    def clear(self):
+        self.lines = {}
+        self._changed()
+
+    @property
+    def items(self):
+        """Lignes avec leurs produits, chargées en une requête"""
+        if self._items is None:
+            from .models import Product
+
+            products = Product.objects.filter(
+                id__in=self.lines, is_available=True
+            ).select_related('category').in_bulk()
+            self._items = CookieCartItems(
+                CookieCartItem(products[product_id], quantity)
+                for product_id, quantity in self.lines.items()
+                if product_id in products
+            )
+        return self._items
+
+    @property
+    def total_items(self):
+        return sum(self.lines.values())
+
+    @property
+    def total_price(self):
+        return sum(item.total_price for item in self.items)
+
+    def as_json(self):
+        """Totaux sérialisables pour les réponses AJAX"""
+        return {'cart_total': self.total_price, 'cart_item_count': self.total_items}
+
+
+def get_cookie_cart(request):
+    """Panier anonyme de la requête, lu une seule fois (écrit par CookieCartMiddleware)"""
+    cart = getattr(request, '_cookie_cart', None)
+    if cart is None:
+        cart = request._cookie_cart = CookieCart.from_request(request)
+    return cart
+
+
+def save_cookie_cart(request, response):
+    """Écrit le cookie du panier anonyme s'il a été modifié pendant la requête"""
+    cart = getattr(request, '_cookie_cart', None)
+    if cart is None or not cart.modified:
+        return response
+    if cart.lines:
+        response.set_signed_cookie(
+            CART_COOKIE_NAME, cart.serialize(), salt=CART_COOKIE_SALT,
+            max_age=CART_COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+        )
+    else:
+        response.delete_cookie(CART_COOKIE_NAME, samesite='Lax')
+    return response
+
+
+def merge_cookie_cart(request, user):
+    """
+    Fusionne le panier anonyme dans le panier en base de l'utilisateur
+
+    Requêtes ensemblistes : lecture des produits valides puis un seul upsert
+    incrémental, quel que soit le nombre d'articles.
+    """
+    from .models import Cart
+
+    cookie_cart = get_cookie_cart(request)
+    if not cookie_cart.lines:
+        return None
+
+    cart, _created = Cart.objects.get_or_create(user=user)
+    valid_ids = available_product_ids(cookie_cart.lines)
+    increment_cart_items(cart, {
+        product_id: quantity
+        for product_id, quantity in cookie_cart.lines.items()
+        if product_id in valid_ids
+    })
+    cookie_cart.clear()
+    return cart
+
+
+# ==================== ÉCRITURES DU PANIER (BASE) ====================
+
+class InvalidCartOperation(ValueError):
+    """Opération de panier mal formée (batch)"""
+
+
+CART_OPERATIONS = ('add', 'set', 'remove')
+
+# Nombre maximum d'opérations acceptées par requête batch
+MAX_BATCH_OPERATIONS = 100
+
+
+def available_product_ids(product_ids):
+    """Sous-ensemble des ids correspondant à des produits disponibles"""
+    from .models import Product
+
+    return set(Product.objects.filter(
+        id__in=list(product_ids), is_available=True
+    ).values_list('id', flat=True))
+
+
+def increment_cart_items(cart, quantities):
+    """
+    Ajoute des quantités au panier sans perte d'incrément
+
+    Un seul INSERT ... ON CONFLICT (cart_id, product_id) DO UPDATE
+    quantity = quantity + excluded.quantity : deux onglets ou un double clic
+    concurrents s'additionnent au lieu de s'écraser.
+    """
+    from .models import CartItem
+
+    quantities = {pid: qty for pid, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+
+    capped = {'postgresql': 'LEAST', 'sqlite': 'MIN'}.get(connection.vendor)
+    if capped is None:
+        # Autres bases : UPDATE atomique, puis INSERT si la ligne n'existe pas
+        for product_id, quantity in quantities.items():
+            updated = CartItem.objects.filter(cart=cart, product_id=product_id).update(
+                quantity=Least(F('quantity') + quantity, CART_MAX_QUANTITY)
+            )
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        CartItem.objects.create(
+                            cart=cart, product_id=product_id,
+                            quantity=min(quantity, CART_MAX_QUANTITY),
+                        )
+                except IntegrityError:
+                    CartItem.objects.filter(cart=cart, product_id=product_id).update(
+                        quantity=Least(F('quantity') + quantity, CART_MAX_QUANTITY)
+                    )
+        return
+
+    meta = CartItem._meta
+    table = connection.ops.quote_name(meta.db_table)
+    columns = [meta.get_field(name).column for name in ('cart', 'product', 'quantity', 'added_at')]
+    cart_col, product_col, quantity_col, added_col = (connection.ops.quote_name(c) for c in columns)
+    now = timezone.now()
+    params = []
+    for product_id, quantity in quantities.items():
+        params += [cart.pk, product_id, min(quantity, CART_MAX_QUANTITY), now]
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(quantities))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({cart_col}, {product_col}, {quantity_col}, {added_col}) '
+            f'VALUES {values} '
+            f'ON CONFLICT ({cart_col}, {product_col}) DO UPDATE SET '
+            f'{quantity_col} = {capped}({table}.{quantity_col} + excluded.{quantity_col}, '
+            f'{CART_MAX_QUANTITY})',
+            params,
+        )
+
+
+def set_cart_items(cart, quantities):
+    """Fixe des quantités absolues (upsert), supprime les lignes à 0"""
+    from .models import CartItem
+
+    to_delete = [pid for pid, qty in quantities.items() if qty <= 0]
+    if to_delete:
+        CartItem.objects.filter(cart=cart, product_id__in=to_delete).delete()
+
+    to_set = {pid: min(qty, CART_MAX_QUANTITY) for pid, qty in quantities.items() if qty > 0}
+    if to_set:
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product_id=pid, quantity=qty) for pid, qty in to_set.items()],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity'],
+        )
+
+
+def parse_cart_operations(operations):
+    """
+    Valide une liste d'opérations {"op": "add"|"set"|"remove",
+    "product_id": int, "quantity": int} et la retourne normalisée
+    """
+    if not isinstance(operations, list) or not operations:
+        raise InvalidCartOperation("Aucune opération")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise InvalidCartOperation("Trop d'opérations")
+
+    parsed = []
+    for operation in operations:
+        try:
+            op = operation['op']
+            product_id = int(operation['product_id'])
+            quantity = int(operation.get('quantity', 1 if op == 'add' else 0))
+        except (KeyError, TypeError, ValueError):
+            raise InvalidCartOperation("Opération invalide")
+        if op not in CART_OPERATIONS or quantity < 0 or (op == 'add' and quantity == 0):
+            raise InvalidCartOperation(f"Opération invalide : {op}")
+        parsed.append((op, product_id, 0 if op == 'remove' else quantity))
+    return parsed
+
+
+def apply_cart_operations(cart, operations):
+    """
+    Applique un lot d'opérations au panier, dans l'ordre, en une transaction
+
+    Pour un panier en base, les opérations sont d'abord réduites par produit
+    (incrément relatif ou quantité absolue), puis appliquées en au plus trois
+    requêtes ensemblistes : un upsert incrémental, un upsert de quantités,
+    un DELETE. Les produits indisponibles sont ignorés pour les ajouts.
+    """
+    operations = parse_cart_operations(operations)
+    valid_ids = available_product_ids({product_id for _op, product_id, _qty in operations})
+
+    if getattr(cart, 'is_cookie_cart', False):
+        for op, product_id, quantity in operations:
+            if op == 'add':
+                if product_id in valid_ids:
+                    cart.add(product_id, quantity)
+            else:
+                cart.set_quantity(product_id, quantity)
+        return cart
+
+    # {product_id: (absolu ?, quantité)}
+    intents = {}
+    for op, product_id, quantity in operations:
+        absolute, current = intents.get(product_id, (False, 0))
+        if op == 'add':
+            if product_id in valid_ids:
+                intents[product_id] = (absolute, current + quantity)
+        else:
+            intents[product_id] = (True, quantity)
+
+    with transaction.atomic():
+        increment_cart_items(cart, {
+            pid: qty for pid, (absolute, qty) in intents.items() if not absolute
+        })
+        set_cart_items(cart, {
+            pid: qty for pid, (absolute, qty) in intents.items()
+            if absolute and (qty == 0 or pid in valid_ids)
+        })
+    return cart
+
+
+# ==================== LECTURE DU PANIER ====================
+
+def line_total_expression(prefix=''):
+    """quantité x prix effectif du produit, calculé en SQL"""
+    return F(f'{prefix}quantity') * F(f'{prefix}product__final_price')
+
+
+def cart_totals(cart):
+    """Nombre d'articles et montant d'un panier en base, en une agrégation"""
+    totals = cart.items.aggregate(
+        total_items=Sum('quantity'),
+        total_price=Sum(
+            line_total_expression(),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+    return {
+        'total_items': totals['total_items'] or 0,
+        'total_price': Decimal(totals['total_price'] or 0).quantize(CENTS),
+    }
+
+
+class CartSummary:
+    """
+    Modèle de lecture d'un panier en base, pour les templates et le JSON
+
+    Les lignes sont chargées avec leurs produits en une requête et les
+    totaux calculés une seule fois par la base, quel que soit le nombre
+    d'accès à `total_items` / `total_price` dans le template.
+    """
+
+    is_cookie_cart = False
+
+    def __init__(self, cart):
+        self.cart = cart
+        self.id = cart.pk
+
+    @cached_property
+    def items(self):
+        return CookieCartItems(
+            self.cart.items.select_related('product', 'product__category').order_by('added_at', 'id')
+        )
+
+    @cached_property
+    def _totals(self):
+        return cart_totals(self.cart)
+
+    @property
+    def total_items(self):
+        return self._totals['total_items']
+
+    @property
+    def total_price(self):
+        return self._totals['total_price']
+
+    def as_json(self):
+        """Totaux sérialisables pour les réponses AJAX"""
+        return {'cart_total': self.total_price, 'cart_item_count': self.total_items}
+
+
+def cart_item_total(cart, item_id):
+    """Sous-total d'une ligne, calculé en SQL sans charger le produit"""
+    from .models import CartItem
+
+    total = CartItem.objects.filter(id=item_id, cart=cart).aggregate(
+        total=Sum(line_total_expression(), output_field=DecimalField(max_digits=12, decimal_places=2))
+    )['total']
+    return Decimal(total or 0).quantize(CENTS)
+
+
+def summarize_cart(cart):
+    """Modèle de lecture d'un panier (le panier cookie fait déjà office de modèle)"""
+    if getattr(cart, 'is_cookie_cart', False):
+        return cart
+    return CartSummary(cart)
+
+
+# ==================== BADGE DU PANIER ====================
+
+def count_cart_items(cart):
+    """Nombre total d'articles du panier, calculé par la base"""
+    if getattr(cart, 'is_cookie_cart', False) or isinstance(cart, CartSummary):
+        return cart.total_items
+    return cart.items.aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def store_cart_count(request, count):
+    """Mémorise le nombre d'articles du panier dans la session"""
+    if request.user.is_authenticated:
+        request.session[CART_COUNT_SESSION_KEY] = count
+    return count
+
+
+def cart_json(request, cart):
+    """
+    Totaux du panier pour les réponses AJAX (une agrégation), en mettant
+    à jour le badge au passage
+    """
+    summary = summarize_cart(cart)
+    store_cart_count(request, summary.total_items)
+    return summary.as_json()
+
+
+def forget_cart_count(request):
+    """Force un recalcul au prochain affichage (ex. changement d'utilisateur)"""
+    request.session.pop(CART_COUNT_SESSION_KEY, None)
+
+
+def get_cart_count(request):
+    """
+    Nombre d'articles pour le badge du panier
+
+    Anonymes : lu dans le cookie. Connectés : lu dans la session, recalculé
+    une fois si absent. Ne crée jamais de session ni de panier.
+    """
+    if not request.user.is_authenticated:
+        return get_cookie_cart(request).total_items
+
+    count = request.session.get(CART_COUNT_SESSION_KEY)
+    if count is None:
+        from .models import Cart
+
+        cart = Cart.objects.filter(user=request.user).first()
+        count = store_cart_count(request, count_cart_items(cart) if cart else 0)
+    return count
+
+
+def lazy_cart_count(request):
+    """Badge évalué uniquement si le template l'utilise"""
+    return SimpleLazyObject(lambda: get_cart_count(request))
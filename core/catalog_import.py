@@ -0,0 +1,341 @@
+"""
+Import en masse du catalogue depuis un flux fournisseur (CSV ou JSON Lines)
+
+Le fichier est lu au fil de l'eau, par lots de `batch_size` lignes :
+
+1. analyse et validation des lignes (fonction pure, sans base : peut être
+   répartie sur plusieurs processus) ;
+2. résolution des catégories par une table slug -> id chargée une fois ;
+3. copie des images locales dans le stockage des médias ;
+4. upsert des produits par slug : Product.objects.bulk_create(
+   update_conflicts=True), une requête par lot au lieu d'un get_or_create
+   par produit.
+
+bulk_create ne déclenche pas les signaux post_save : l'index de recherche
+des produits du lot est mis à jour explicitement et le cache du catalogue
+invalidé une fois, en fin d'import.
+"""
+
+import csv
+import json
+import multiprocessing
+import time
+from collections import deque
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.text import slugify
+
+from .caching import bump_catalog_version
+from .categories import invalidate_categories
+from .models import Category, Product
+from .search import get_search_backend
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Colonnes reprises telles quelles (texte) et leur longueur maximale
+TEXT_FIELDS = {
+    'name': 200,
+    'description': None,
+    'brand': 100,
+    'dimensions': 50,
+    'meta_title': 200,
+    'meta_description': None,
+}
+
+# Champs écrasés lors de la mise à jour d'un produit existant
+UPDATE_FIELDS = [
+    'name', 'description', 'price', 'discount_price', 'category', 'stock', 'is_available',
+    'brand', 'weight', 'dimensions', 'meta_title', 'meta_description', 'updated_at',
+]
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'oui', 'vrai'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'non', 'faux', ''}
+
+
+class RowError(ValueError):
+    """Ligne invalide ; le message est destiné au rapport d'import"""
+
+    def __init__(self, line, message):
+        super().__init__(f"ligne {line} : {message}")
+        self.line = line
+
+
+# ==================== LECTURE ====================
+
+def detect_format(path):
+    return 'jsonl' if Path(path).suffix.lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+def read_rows(path, fmt=None):
+    """Itère sur (numéro de ligne, dict brut) sans charger le fichier"""
+    fmt = fmt or detect_format(path)
+    with open(path, encoding='utf-8-sig', newline='') as handle:
+        if fmt == 'csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line, text in enumerate(handle, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as exc:
+                row = {'__error__': f"JSON invalide ({exc})"}
+            yield line, row
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# ==================== VALIDATION ====================
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _decimal(line, raw, field, max_value, required=False):
+    value = _text(raw.get(field)).replace(',', '.')
+    if not value:
+        if required:
+            raise RowError(line, f"{field} manquant")
+        return None
+    try:
+        number = Decimal(value).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError(line, f"{field} invalide : {value}")
+    if number < 0 or number >= max_value:
+        raise RowError(line, f"{field} hors limites : {value}")
+    return number
+
+
+def _boolean(line, raw, field, default):
+    value = raw.get(field)
+    if isinstance(value, bool):
+        return value
+    value = _text(value).lower()
+    if not value:
+        return default
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(line, f"{field} invalide : {value}")
+
+
+def parse_row(line, raw):
+    """
+    Valide une ligne brute et retourne les valeurs du produit
+
+    Sans accès à la base : la catégorie reste un slug, résolu à l'écriture.
+    Lève RowError si la ligne est invalide.
+    """
+    if '__error__' in raw:
+        raise RowError(line, raw['__error__'])
+
+    values = {}
+    for field, max_length in TEXT_FIELDS.items():
+        text = _text(raw.get(field))
+        if max_length and len(text) > max_length:
+            raise RowError(line, f"{field} trop long ({len(text)} > {max_length})")
+        values[field] = text
+    if not values['name']:
+        raise RowError(line, "name manquant")
+
+    values['slug'] = slugify(_text(raw.get('slug')) or values['name'])[:200]
+    if not values['slug']:
+        raise RowError(line, "slug manquant")
+    values['category'] = slugify(_text(raw.get('category')))
+    if not values['category']:
+        raise RowError(line, "category manquante")
+
+    values['price'] = _decimal(line, raw, 'price', Decimal('1e8'), required=True)
+    values['discount_price'] = _decimal(line, raw, 'discount_price', Decimal('1e8'))
+    values['weight'] = _decimal(line, raw, 'weight', Decimal('1e4'))
+
+    stock = _text(raw.get('stock')) or '0'
+    try:
+        values['stock'] = int(stock)
+    except ValueError:
+        raise RowError(line, f"stock invalide : {stock}")
+    if values['stock'] < 0:
+        raise RowError(line, f"stock négatif : {stock}")
+
+    values['is_available'] = _boolean(line, raw, 'is_available', True)
+    values['image'] = _text(raw.get('image'))
+    return values
+
+
+def parse_chunk(chunk):
+    """Analyse un lot de (ligne, dict brut) ; retourne (produits, erreurs)"""
+    rows, errors = [], []
+    for line, raw in chunk:
+        try:
+            rows.append(parse_row(line, raw))
+        except RowError as exc:
+            errors.append(str(exc))
+    return rows, errors
+
+
+# ==================== ÉCRITURE ====================
+
+def category_slug_map(create=()):
+    """Table slug -> id des catégories ; crée au besoin les slugs de `create`"""
+    slugs = dict(Category.objects.values_list('slug', 'id'))
+    missing = [slug for slug in dict.fromkeys(create) if slug not in slugs]
+    if missing:
+        Category.objects.bulk_create(
+            [Category(slug=slug, name=slug.replace('-', ' ').capitalize()) for slug in missing],
+            ignore_conflicts=True,
+        )
+        slugs = dict(Category.objects.values_list('slug', 'id'))
+        invalidate_categories()
+    return slugs
+
+
+def attach_image(values, images_dir):
+    """Copie l'image locale de la ligne dans les médias ; retourne son nom stocké"""
+    source = Path(values['image'])
+    if not source.is_absolute():
+        source = Path(images_dir) / source
+    if not source.is_file():
+        raise FileNotFoundError(f"image introuvable : {source}")
+
+    name = f"{Product._meta.get_field('image').upload_to}{values['slug']}{source.suffix.lower()}"
+    if default_storage.exists(name):
+        # Réimport du même flux : pas de nouvelle copie si le fichier est identique
+        if default_storage.size(name) == source.stat().st_size:
+            return name
+        default_storage.delete(name)
+    with source.open('rb') as handle:
+        return default_storage.save(name, File(handle))
+
+
+class ImportReport:
+    """Compteurs de import_catalog()"""
+
+    def __init__(self):
+        self.read = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+def write_batch(rows, slugs, images_dir, dry_run=False):
+    """
+    Upsert d'un lot de produits validés
+
+    Retourne (créés, mis à jour, erreurs). Les lignes sans image ne
+    touchent pas à l'image d'un produit existant.
+    """
+    errors = []
+    by_slug = {}
+    for values in rows:
+        category_id = slugs.get(values['category'])
+        if category_id is None:
+            errors.append(f"{values['slug']} : catégorie inconnue « {values['category']} »")
+            continue
+        by_slug[values['slug']] = (values, category_id)  # dernière occurrence gagnante
+
+    existing = set(Product.objects.filter(slug__in=list(by_slug)).values_list('slug', flat=True))
+    if dry_run:
+        return len(by_slug) - len(existing), len(existing), errors
+
+    with_image, without_image = [], []
+    for slug, (values, category_id) in by_slug.items():
+        product = Product(
+            slug=slug, category_id=category_id,
+            **{field: values[field] for field in UPDATE_FIELDS if field not in ('category', 'updated_at')},
+        )
+        if values['image']:
+            try:
+                product.image = attach_image(values, images_dir)
+            except OSError as exc:
+                errors.append(f"{slug} : {exc}")
+                continue
+            with_image.append(product)
+        else:
+            without_image.append(product)
+
+    written = [product.slug for product in with_image + without_image]
+    with transaction.atomic():
+        for products, fields in ((with_image, UPDATE_FIELDS + ['image']), (without_image, UPDATE_FIELDS)):
+            if products:
+                Product.objects.bulk_create(
+                    products, update_conflicts=True, unique_fields=['slug'], update_fields=fields,
+                )
+        # bulk_create ne déclenche pas post_save : index de recherche du lot
+        ids = Product.objects.filter(slug__in=written).values_list('id', flat=True)
+        get_search_backend().index_products(list(ids))
+    updated = sum(1 for slug in written if slug in existing)
+    return len(written) - updated, updated, errors
+
+
+# ==================== PIPELINE ====================
+
+def _parsed_batches(batches, workers):
+    """(produits, erreurs) de chaque lot, dans l'ordre, analysés sur `workers` processus"""
+    if workers <= 1:
+        for chunk in batches:
+            yield chunk, parse_chunk(chunk)
+        return
+
+    # Fenêtre bornée de lots en cours : le fichier n'est jamais lu d'avance en entier
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for chunk in batches:
+            pending.append((chunk, pool.apply_async(parse_chunk, (chunk,))))
+            if len(pending) >= workers * 2:
+                chunk, result = pending.popleft()
+                yield chunk, result.get()
+        while pending:
+            chunk, result = pending.popleft()
+            yield chunk, result.get()
+
+
+def import_catalog(path, fmt=None, batch_size=DEFAULT_BATCH_SIZE, images_dir=None, workers=1,
+                   create_categories=False, dry_run=False, on_batch=None):
+    """
+    Importe le fichier `path` ; retourne un ImportReport
+
+    `on_batch(report)` est appelé après chaque lot (suivi de progression).
+    """
+    report = ImportReport()
+    images_dir = images_dir or Path(path).resolve().parent
+    slugs = category_slug_map()
+
+    batches = chunked(read_rows(path, fmt), batch_size)
+    for chunk, (rows, errors) in _parsed_batches(batches, workers):
+        report.read += len(chunk)
+        report.errors.extend(errors)
+        if create_categories and not dry_run:
+            unknown = [values['category'] for values in rows if values['category'] not in slugs]
+            if unknown:
+                slugs = category_slug_map(create=unknown)
+        created, updated, errors = write_batch(rows, slugs, images_dir, dry_run)
+        report.created += created
+        report.updated += updated
+        report.errors.extend(errors)
+        if on_batch is not None:
+            on_batch(report)
+
+    if not dry_run and (report.created or report.updated):
+        bump_catalog_version()
+    return report
@@ -0,0 +1,90 @@
+"""
+Registre des catégories partagé par le processus
+
+Les catégories sont peu nombreuses et lues sur chaque page (menu de
+navigation, listes, recherche). Le registre les charge une fois par
+processus et ne les relit que lorsque la version `categories:version`
+change dans le cache partagé ; chaque worker recharge alors au prochain
+accès. En régime établi, une recherche par slug ou par id ne coûte aucune
+requête SQL.
+
+Le compteur de version n'est réellement partagé que si le cache l'est
+(Redis, Memcached) : avec LocMemCache, chaque processus a le sien et ne
+voit pas les invalidations des autres. Le registre est donc aussi relu
+au plus tard CATEGORY_REGISTRY_TTL secondes après son chargement.
+
+Les objets retournés sont partagés entre requêtes : ne pas les modifier.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.http import Http404
+
+from .caching import bump_version, get_version
+from .models import Category
+
+CATEGORY_VERSION_KEY = 'categories:version'
+
+# Âge maximal du registre chargé, quelle que soit la version (secondes)
+DEFAULT_REGISTRY_TTL = 60
+
+
+class CategoryRegistry:
+    """Index slug -> catégorie et id -> catégorie, rechargé sur changement de version ou à expiration"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._expires_at = 0.0
+        self._categories = []
+        self._by_slug = {}
+        self._by_id = {}
+
+    def _is_current(self, version):
+        return version == self._version and time.monotonic() < self._expires_at
+
+    def _ensure_loaded(self):
+        version = get_version(CATEGORY_VERSION_KEY)
+        if self._is_current(version):
+            return
+        with self._lock:
+            if self._is_current(version):
+                return
+            categories = list(Category.objects.all())
+            self._by_slug = {category.slug: category for category in categories}
+            self._by_id = {category.pk: category for category in categories}
+            self._categories = categories
+            self._version = version
+            ttl = getattr(settings, 'CATEGORY_REGISTRY_TTL', DEFAULT_REGISTRY_TTL)
+            self._expires_at = time.monotonic() + ttl
+
+    def all(self):
+        """Toutes les catégories, dans l'ordre du modèle (par nom)"""
+        self._ensure_loaded()
+        return self._categories
+
+    def get_by_slug(self, slug):
+        self._ensure_loaded()
+        return self._by_slug.get(slug)
+
+    def get_by_id(self, category_id):
+        self._ensure_loaded()
+        return self._by_id.get(category_id)
+
+
+category_registry = CategoryRegistry()
+
+
+def get_category_or_404(slug):
+    """Équivalent de get_object_or_404(Category, slug=slug) servi par le registre"""
+    category = category_registry.get_by_slug(slug)
+    if category is None:
+        raise Http404("Aucune catégorie ne correspond à cette adresse.")
+    return category
+
+
+def invalidate_categories():
+    """Force le rechargement du registre dans tous les processus"""
+    bump_version(CATEGORY_VERSION_KEY)
@@ -0,0 +1,226 @@
+"""
+Service de passage de commande
+
+Toute la commande est passée dans une seule transaction. Si le panier a
+des réservations actives couvrant exactement ses lignes (core.inventory),
+elles sont consommées (supprimées) et les produits lus sans verrou : le
+stock leur était déjà réservé. Sinon les produits du panier sont
+verrouillés (SELECT ... FOR UPDATE) dans l'ordre des ids, pour que deux
+commandes concurrentes prennent leurs verrous dans le même ordre et ne
+puissent pas s'interbloquer, et le stock est comparé aux réservations des
+autres paniers. Dans les deux cas les produits retirés ou indisponibles
+sont refusés.
+
+Le stock reste décrémenté au paiement, dans les deux cas, par un seul
+UPDATE conditionnel (stock = stock - quantité, uniquement si stock >=
+quantité) : Product.stock est ainsi toujours à jour. Les réservations
+évitent le SELECT FOR UPDATE et l'attente qu'il impose, mais pas cette
+écriture sur les lignes produit, dont les verrous sont tenus jusqu'au
+commit. Les lignes de commande sont ensuite créées par un bulk_create et
+le panier est vidé.
+
+Un stock insuffisant ou un verrou impossible à obtenir annule tout et lève
+une CheckoutError dont le message peut être affiché tel quel.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+
+from .cart import CENTS
+from .customer_stats import record_order_placed
+from .inventory import consume_reservations, held_quantities, release_cart_reservations
+from .jobs import enqueue
+from .models import CartItem, Order, OrderItem, Product
+from .order_numbers import next_order_number
+from .outbox import record_order_created
+from .sales import record_order_sales
+
+
+class CheckoutError(Exception):
+    """Commande impossible ; le message est destiné au client"""
+
+
+class EmptyCart(CheckoutError):
+    """Le panier ne contient plus aucun article"""
+
+
+class OutOfStock(CheckoutError):
+    """Un ou plusieurs produits sont indisponibles ou en quantité insuffisante"""
+
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(products)
+        super().__init__(f"Stock insuffisant pour : {names}. Votre panier n'a pas été modifié.")
+
+
+class CheckoutBusy(CheckoutError):
+    """Les produits sont verrouillés par d'autres commandes (forte affluence)"""
+
+    def __init__(self):
+        super().__init__("Forte affluence sur ces produits, veuillez réessayer dans un instant.")
+
+
+IDEMPOTENCY_KEY_RE = re.compile(r'^[\w-]{8,64}$')
+
+
+def clean_idempotency_key(value):
+    """Retourne la clé si elle est exploitable, sinon None"""
+    if value and IDEMPOTENCY_KEY_RE.match(value):
+        return value
+    return None
+
+
+def find_order_by_key(user, key):
+    """Commande déjà passée avec cette clé (une lecture sur l'index unique)"""
+    if not key:
+        return None
+    return Order.objects.filter(user=user, idempotency_key=key).first()
+
+
+def _set_lock_timeout():
+    """Borne l'attente des verrous pour ne pas empiler les requêtes en pic de charge"""
+    timeout = getattr(settings, 'CHECKOUT_LOCK_TIMEOUT', 3000)
+    if connection.vendor == 'postgresql' and timeout:
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL lock_timeout = %s', [f'{int(timeout)}ms'])
+
+
+def _cart_quantities(cart):
+    """{product_id: quantité} des lignes du panier, relues dans la transaction"""
+    quantities = {}
+    for product_id, quantity in CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity'):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def _load_products(product_ids):
+    """Produits d'un panier couvert par ses réservations (sans verrou)"""
+    return list(
+        Product.objects.filter(id__in=product_ids)
+        .order_by('id')
+        .only('id', 'name', 'stock', 'is_available', 'final_price')
+    )
+
+
+def _lock_products(product_ids):
+    """Verrouille les produits dans un ordre déterministe (par id)"""
+    return list(
+        Product.objects.select_for_update(of=('self',))
+        .filter(id__in=product_ids)
+        .order_by('id')
+        .only('id', 'name', 'stock', 'is_available', 'final_price')
+    )
+
+
+def _decrement_stock(products, quantities):
+    """Décrémente tous les stocks en un UPDATE ; False si une ligne n'a pas suivi"""
+    guard = Q()
+    whens = []
+    for product in products:
+        quantity = quantities[product.id]
+        guard |= Q(id=product.id, stock__gte=quantity)
+        whens.append(When(id=product.id, then=F('stock') - quantity))
+    updated = Product.objects.filter(guard).update(
+        stock=Case(*whens, default=F('stock'), output_field=PositiveIntegerField())
+    )
+    return updated == len(products)
+
+
+def place_order(cart, order):
+    """
+    Transforme le panier en commande
+
+    `order` est une commande non enregistrée (issue du CheckoutForm) dont
+    l'utilisateur est renseigné. Les prix et le total sont relus en base dans
+    la transaction, pas repris de l'affichage. Retourne la commande créée.
+
+    Si `order.idempotency_key` est renseignée et qu'une commande existe déjà
+    pour cette clé, celle-ci est retournée telle quelle (`replayed` vaut
+    alors True) : une double soumission ne crée jamais deux commandes.
+    """
+    existing = find_order_by_key(order.user, order.idempotency_key)
+    if existing is not None:
+        existing.replayed = True
+        return existing
+
+    # Pris hors transaction : le compteur n'est jamais verrouillé pendant le paiement
+    if not order.order_number:
+        order.order_number = next_order_number()
+
+    try:
+        with transaction.atomic():
+            _set_lock_timeout()
+
+            quantities = _cart_quantities(cart)
+            if not quantities:
+                raise EmptyCart("Votre panier est vide")
+
+            # Enregistrée d'abord (numéro et clé uniques) ; le total est fixé
+            # une fois les prix lus
+            order.total_amount = 0
+            order.stock_status = 'taken'  # décrémenté plus bas, dans cette transaction
+            order.save()
+
+            if consume_reservations(cart, quantities):
+                # Les réservations garantissaient le stock : pas de verrou préalable
+                products = _load_products(quantities)
+                held = {}
+            else:
+                products = _lock_products(quantities)
+                held = held_quantities(quantities, exclude_cart=cart)
+                release_cart_reservations(cart)
+
+            unavailable = [
+                product.name for product in products
+                if not product.is_available
+                or product.stock - held.get(product.id, 0) < quantities[product.id]
+            ]
+            if unavailable or len(products) != len(quantities):
+                raise OutOfStock(unavailable or ["produit retiré du catalogue"])
+
+            # Dans les deux cas le stock est décrémenté avec la commande ; la
+            # garde SQL couvre les lectures sans verrou (réservations, SQLite)
+            if not _decrement_stock(products, quantities):
+                raise OutOfStock([product.name for product in products])
+
+            total = sum(product.final_price * quantities[product.id] for product in products)
+            order.total_amount = total.quantize(CENTS)
+            order.save(update_fields=['total_amount', 'updated_at'])
+
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product_id=product.id,
+                    quantity=quantities[product.id],
+                    price=product.final_price,
+                )
+                for product in products
+            ])
+
+            CartItem.objects.filter(cart=cart).delete()
+
+            # Événement pour l'entrepôt / l'ERP et statistiques client,
+            # validés avec la commande
+            record_order_created(order)
+            record_order_placed(order)
+            # Cumuls de ventes : appliqués après le commit (voir core.sales)
+            record_order_sales(order)
+
+            # Effets de bord hors requête, mis en file au commit
+            enqueue('send_order_confirmation', order_id=order.id)
+            enqueue('notify_low_stock', product_ids=sorted(quantities))
+    except IntegrityError:
+        # Soumission concurrente avec la même clé : l'autre requête a gagné
+        existing = find_order_by_key(order.user, order.idempotency_key)
+        if existing is None:
+            raise
+        existing.replayed = True
+        return existing
+    except OperationalError as exc:
+        # lock_timeout, interblocage ou base verrouillée : rien n'a été écrit
+        raise CheckoutBusy() from exc
+    order.replayed = False
+    return order
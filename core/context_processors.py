@@ -2,56 +2,38 @@
 Processeurs de contexte pour l'application e-commerce
 """
 # core/context_processors.py (créez ce fichier s'il n'existe pas)
-from django.db.models import Count, Sum
-from django.utils import timezone
-from datetime import timedelta
-from .models import User, Product, Order
-from .views import get_or_create_cart
+from .cart import lazy_cart_count
+from .categories import category_registry
+from .dashboard import get_admin_stats
 
 def cart_item_count(request):
     """
     Ajoute le nombre d'articles dans le panier au contexte
     Accessible dans tous les templates
+
+    Valeur paresseuse lue dans la session (voir core.cart) : aucune requête
+    ni création de panier tant que le template ne l'affiche pas.
+    """
+    return {'cart_item_count': lazy_cart_count(request)}
+
+
+def categories(request):
     """
-    if request.user.is_authenticated or request.session.session_key:
-        cart = get_or_create_cart(request)
-        return {'cart_item_count': cart.total_items}
-    return {'cart_item_count': 0}
+    Catégories du menu de navigation (base.html), servies par le registre
+    partagé : aucune requête en régime établi
+    """
+    return {'categories': category_registry.all()}
 
 
 
 
 def admin_stats(request):
-    """Contexte pour les statistiques de l'admin"""
+    """
+    Contexte pour les statistiques de l'admin
+
+    Lu dans l'instantané enregistré (core.dashboard) : une lecture par clé
+    primaire par page d'admin, quelle que soit la taille des tables.
+    """
     if request.path.startswith('/admin/'):
-        # Statistiques utilisateurs
-        total_users = User.objects.count()
-        active_users = User.objects.filter(is_active=True).count()
-        staff_users = User.objects.filter(is_staff=True).count()
-        
-        # Nouveaux utilisateurs (7 derniers jours)
-        seven_days_ago = timezone.now() - timedelta(days=7)
-        new_users_7d = User.objects.filter(date_joined__gte=seven_days_ago).count()
-        
-        # 5 derniers utilisateurs
-        latest_users = User.objects.order_by('-date_joined')[:5]
-        
-        # Statistiques produits
-        product_count = Product.objects.count()
-        
-        # Statistiques commandes
-        order_count = Order.objects.count()
-        revenue = Order.objects.aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        return {
-            'user_count': total_users,
-            'active_users': active_users,
-            'staff_users': staff_users,
-            'total_users': total_users,
-            'new_users_7d': new_users_7d,
-            'latest_users': latest_users,
-            'product_count': product_count,
-            'order_count': order_count,
-            'revenue': revenue,
-        }
-    return {}
\ No newline at end of file
+        return get_admin_stats()
+    return {}
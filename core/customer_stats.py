@@ -0,0 +1,128 @@
+"""
+Statistiques de commandes par client (table CustomerStats)
+
+- commande passée : order_count + 1, total_ordered + montant, last_order_at ;
+- passage à « livrée » : delivered_count + 1, lifetime_spend + montant
+  (et l'inverse si une commande livrée change à nouveau de statut).
+
+Les mises à jour sont des UPDATE relatifs (F()) exécutés dans la
+transaction de la commande : deux commandes simultanées du même client
+s'additionnent sans se marcher dessus. rebuild_customer_stats() recalcule
+tout à partir des commandes en une requête agrégée.
+"""
+
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import CustomerStats, Order
+
+DELIVERED = 'delivered'
+
+
+def _apply(user_id, create_defaults, **updates):
+    """UPDATE relatif de la ligne du client, créée au besoin"""
+    if CustomerStats.objects.filter(user_id=user_id).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            CustomerStats.objects.create(user_id=user_id, **create_defaults)
+    except IntegrityError:
+        # Créée entre-temps par une transaction concurrente
+        CustomerStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def record_order_placed(order):
+    """Compte une nouvelle commande (à appeler dans sa transaction)"""
+    delivered = order.status == DELIVERED
+    amount = order.total_amount
+    updates = {
+        'order_count': F('order_count') + 1,
+        'total_ordered': F('total_ordered') + amount,
+        'last_order_at': Greatest(Coalesce(F('last_order_at'), Value(order.created_at)), Value(order.created_at)),
+    }
+    if delivered:
+        updates['delivered_count'] = F('delivered_count') + 1
+        updates['lifetime_spend'] = F('lifetime_spend') + amount
+    _apply(order.user_id, {
+        'order_count': 1,
+        'total_ordered': amount,
+        'delivered_count': int(delivered),
+        'lifetime_spend': amount if delivered else Decimal('0'),
+        'last_order_at': order.created_at,
+    }, **updates)
+
+
+def record_status_changes(changes, new_status):
+    """
+    Applique des changements de statut
+
+    `changes` : itérable de (user_id, ancien statut, montant). Seuls les
+    passages vers ou depuis « livrée » modifient les statistiques ; les
+    deltas sont regroupés par client (un UPDATE par client concerné).
+    """
+    deltas = {}
+    for user_id, previous_status, amount in changes:
+        if previous_status == new_status:
+            continue
+        if new_status == DELIVERED:
+            sign = 1
+        elif previous_status == DELIVERED:
+            sign = -1
+        else:
+            continue
+        count, spend = deltas.get(user_id, (0, Decimal('0')))
+        deltas[user_id] = (count + sign, spend + sign * amount)
+
+    for user_id, (count, spend) in sorted(deltas.items()):
+        _apply(user_id, {
+            'delivered_count': max(count, 0),
+            'lifetime_spend': max(spend, Decimal('0')),
+        }, delivered_count=F('delivered_count') + count, lifetime_spend=F('lifetime_spend') + spend)
+
+
+def get_customer_stats(user):
+    """Statistiques du client (une lecture par clé primaire), vides s'il n'a rien commandé"""
+    stats = CustomerStats.objects.filter(user_id=user.pk).first()
+    return stats or CustomerStats(user_id=user.pk)
+
+
+def rebuild_customer_stats(user_ids=None):
+    """
+    Recalcule les statistiques depuis les commandes
+
+    Une requête agrégée par client puis un upsert en masse ; les clients
+    sans commande sont retirés. Retourne le nombre de lignes écrites.
+    """
+    orders = Order.objects.all()
+    if user_ids is not None:
+        orders = orders.filter(user_id__in=user_ids)
+
+    delivered = Q(status=DELIVERED)
+    rows = orders.values('user_id').annotate(
+        order_count=Count('id'),
+        total_ordered=Sum('total_amount'),
+        delivered_count=Count('id', filter=delivered),
+        lifetime_spend=Coalesce(Sum('total_amount', filter=delivered), Value(Decimal('0'))),
+        last_order_at=Max('created_at'),
+    ).order_by()
+
+    stats = [CustomerStats(**row) for row in rows]
+    with transaction.atomic():
+        stale = CustomerStats.objects.exclude(Exists(Order.objects.filter(user_id=OuterRef('user_id'))))
+        if user_ids is not None:
+            stale = stale.filter(user_id__in=user_ids)
+        stale.delete()
+        CustomerStats.objects.bulk_create(
+            stats,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[
+                'order_count', 'total_ordered', 'delivered_count',
+                'lifetime_spend', 'last_order_at', 'updated_at',
+            ],
+        )
+    return len(stats)
@@ -0,0 +1,108 @@
+"""
+Instantané des statistiques du tableau de bord d'administration
+
+Les chiffres (utilisateurs, produits, commandes, chiffre d'affaires) sont
+calculés en quelques requêtes agrégées puis stockés avec leur date de
+calcul dans une table d'une ligne (AdminStatsSnapshot) : le recalcul fait
+par un worker `run_jobs` est ainsi visible de tous les processus web, quel
+que soit le cache configuré. Le processeur de contexte admin_stats ne fait
+qu'une lecture par clé primaire ; un instantané plus vieux que
+ADMIN_STATS_MAX_AGE est servi tel quel pendant qu'une tâche d'arrière-plan
+le recalcule. Le bouton « Actualiser » du tableau de bord et la commande
+`refresh_admin_stats` (cron) forcent un recalcul.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .jobs import enqueue
+from .models import AdminStatsSnapshot, CustomerStats, Product, User
+
+SNAPSHOT_PK = 1
+
+# Délai après lequel une demande de recalcul non servie peut être renouvelée (s)
+REFRESH_REQUEST_TIMEOUT = 300
+
+DEFAULT_MAX_AGE = 300
+
+
+def compute_admin_stats():
+    """Calcule l'instantané (quatre requêtes)"""
+    since = timezone.now() - timedelta(days=7)
+    users = User.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+        staff=Count('id', filter=Q(is_staff=True)),
+        new_7d=Count('id', filter=Q(date_joined__gte=since)),
+    )
+    latest_users = list(
+        User.objects.order_by('-date_joined')
+        .values('id', 'username', 'first_name', 'date_joined')[:5]
+    )
+    orders = CustomerStats.objects.aggregate(
+        order_count=Sum('order_count'), revenue=Sum('total_ordered'),
+    )
+    return {
+        'user_count': users['total'],
+        'total_users': users['total'],
+        'active_users': users['active'],
+        'staff_users': users['staff'],
+        'new_users_7d': users['new_7d'],
+        'latest_users': latest_users,
+        'product_count': Product.objects.count(),
+        'order_count': orders['order_count'] or 0,
+        'revenue': orders['revenue'] or 0,
+        'stats_generated_at': timezone.now(),
+    }
+
+
+def refresh_admin_stats():
+    """Recalcule et enregistre l'instantané ; le retourne"""
+    snapshot = compute_admin_stats()
+    data = {key: value for key, value in snapshot.items() if key != 'stats_generated_at'}
+    AdminStatsSnapshot.objects.update_or_create(pk=SNAPSHOT_PK, defaults={
+        'data': data,
+        'generated_at': snapshot['stats_generated_at'],
+        'refresh_requested_at': None,
+    })
+    return snapshot
+
+
+def _from_row(row):
+    """Instantané lu en base ; les dates sérialisées en JSON redeviennent des datetime"""
+    snapshot = dict(row.data)
+    snapshot['latest_users'] = [
+        {**user, 'date_joined': parse_datetime(user['date_joined'])}
+        for user in snapshot.get('latest_users', [])
+    ]
+    snapshot['stats_generated_at'] = row.generated_at
+    return snapshot
+
+
+def get_admin_stats():
+    """
+    Instantané courant (une lecture par clé primaire)
+
+    Calculé sur place seulement s'il n'existe pas encore ; s'il est périmé,
+    un seul recalcul est mis en file : l'UPDATE conditionnel sur
+    refresh_requested_at ne réussit que pour un processus.
+    """
+    row = AdminStatsSnapshot.objects.filter(pk=SNAPSHOT_PK).first()
+    if row is None:
+        return refresh_admin_stats()
+
+    now = timezone.now()
+    max_age = timedelta(seconds=getattr(settings, 'ADMIN_STATS_MAX_AGE', DEFAULT_MAX_AGE))
+    if now - row.generated_at > max_age:
+        # Une demande restée sans suite (worker arrêté) est renouvelée
+        claimed = AdminStatsSnapshot.objects.filter(pk=SNAPSHOT_PK).filter(
+            Q(refresh_requested_at__isnull=True)
+            | Q(refresh_requested_at__lt=now - timedelta(seconds=REFRESH_REQUEST_TIMEOUT))
+        ).update(refresh_requested_at=now)
+        if claimed:
+            enqueue('refresh_admin_stats')
+    return _from_row(row)
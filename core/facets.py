@@ -0,0 +1,88 @@
+"""
+Facettes des listes de produits (catégories, marques, tranches de prix)
+
+Chaque famille de facettes est calculée par une seule requête agrégée sur le
+queryset filtré courant, au lieu d'un COUNT par valeur. Le résultat est mis
+en cache par jeu de filtres normalisé et invalidé avec la version du catalogue.
+"""
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .caching import catalog_key
+
+# Filtres de la requête qui influencent les facettes
+FACET_FILTERS = ('category', 'q', 'brand', 'min_price', 'max_price', 'in_stock')
+
+# Tranches de prix (bornes en euros, borne haute exclue)
+PRICE_BUCKETS = [
+    (0, 50),
+    (50, 100),
+    (100, 250),
+    (250, 500),
+    (500, 1000),
+    (1000, None),
+]
+
+TOP_BRANDS = 10
+
+FACETS_CACHE_TIMEOUT = 600
+
+
+def normalize_filters(params, **extra):
+    """Réduit les paramètres GET à un tuple trié et stable pour la clé de cache"""
+    values = {key: params.get(key, '') for key in FACET_FILTERS}
+    values.update(extra)
+    return tuple(sorted(
+        (key, str(value).strip().lower()) for key, value in values.items() if value
+    ))
+
+
+def compute_facets(queryset, category_queryset=None):
+    """
+    Calcule les facettes d'un queryset de produits
+
+    `category_queryset` permet de compter les catégories sans le filtre de
+    catégorie courant (pour proposer les autres catégories dans la barre).
+    """
+    queryset = queryset.order_by()
+    category_queryset = (category_queryset if category_queryset is not None else queryset).order_by()
+
+    categories = {
+        row['category_id']: row['count']
+        for row in category_queryset.values('category_id').annotate(count=Count('id'))
+    }
+
+    brands = list(
+        queryset.exclude(brand='')
+        .values('brand')
+        .annotate(count=Count('id'))
+        .order_by('-count', 'brand')[:TOP_BRANDS]
+    )
+
+    aggregates = {'total': Count('id')}
+    for i, (low, high) in enumerate(PRICE_BUCKETS):
+        condition = Q(final_price__gte=low)
+        if high is not None:
+            condition &= Q(final_price__lt=high)
+        aggregates[f'bucket_{i}'] = Count('id', filter=condition)
+    totals = queryset.aggregate(**aggregates)
+
+    return {
+        'total': totals['total'],
+        'categories': categories,
+        'brands': brands,
+        'price_buckets': [
+            {'min': low, 'max': high, 'count': totals[f'bucket_{i}']}
+            for i, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+    }
+
+
+def get_facets(queryset, filters, category_queryset=None):
+    """Facettes mises en cache pour un jeu de filtres normalisé (voir normalize_filters)"""
+    return cache.get_or_set(
+        catalog_key('facets', filters),
+        lambda: compute_facets(queryset, category_queryset),
+        FACETS_CACHE_TIMEOUT,
+    )
@@ -3,11 +3,12 @@ Forms pour l'application e-commerce
 """
 
 from django import forms
-from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, PasswordChangeForm
+from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, PasswordChangeForm, PasswordResetForm
 from django.contrib.auth import get_user_model  # ← IMPORTANT
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 import re
+from .jobs import enqueue
 from .models import Order, UserProfile
 
 # Utilisez get_user_model() pour obtenir votre modèle User personnalisé
@@ -253,4 +254,28 @@ class PasswordChangeCustomForm(PasswordChangeForm):
         super().__init__(*args, **kwargs)
         # Personnalisation des champs
         for field_name in ['old_password', 'new_password1', 'new_password2']:
-            self.fields[field_name].widget.attrs.update({'class': 'form-control'})
\ No newline at end of file
+            self.fields[field_name].widget.attrs.update({'class': 'form-control'})
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Réinitialisation du mot de passe : l'email part en tâche de fond (core.jobs)"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['email'].widget.attrs.update({'class': 'form-control'})
+    
+    def send_mail(self, subject_template_name, email_template_name, context,
+                  from_email, to_email, html_email_template_name=None):
+        # Le lien (uid, jeton) est recalculé par la tâche : aucun jeton de
+        # réinitialisation valide n'est stocké dans la file des tâches
+        enqueue(
+            'send_password_reset_email',
+            user_id=context['user'].pk,
+            domain=context['domain'],
+            site_name=context['site_name'],
+            protocol=context['protocol'],
+            subject_template_name=subject_template_name,
+            email_template_name=email_template_name,
+            from_email=from_email,
+            to_email=to_email,
+            html_email_template_name=html_email_template_name,
+        )
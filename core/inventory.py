@@ -0,0 +1,215 @@
+"""
+Réservations de stock à durée limitée
+
+Lorsqu'un client entre dans le tunnel de paiement, les quantités de son
+panier sont réservées pour RESERVATION_TTL secondes. Le stock disponible
+vu par les autres clients est alors :
+
+    disponible = Product.stock - réservations actives
+
+où une réservation est active tant qu'elle n'a pas expiré. Au paiement,
+les réservations du panier sont consommées : Product.stock est décrémenté
+et les réservations supprimées dans la transaction de la commande, si bien
+que la colonne stock est toujours à jour pour ses autres lecteurs (admin,
+import du catalogue, alertes). L'annulation d'une commande remet ses
+quantités en stock (restock_orders) si son paiement l'avait décrémenté
+(Order.stock_status). La commande `release_reservations`
+supprime par lots les réservations expirées.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, F, IntegerField, OuterRef, PositiveIntegerField, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import CartItem, Order, OrderItem, Product, StockReservation
+
+# Durée d'une réservation par défaut (secondes)
+DEFAULT_RESERVATION_TTL = 15 * 60
+
+# Nombre de réservations traitées par lot par le balayeur
+SWEEP_BATCH_SIZE = 500
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'RESERVATION_TTL', DEFAULT_RESERVATION_TTL))
+
+
+def active_holds(now=None):
+    """Réservations qui retiennent encore du stock (non expirées)"""
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def held_quantities(product_ids, exclude_cart=None):
+    """{product_id: quantité retenue} pour les produits donnés"""
+    holds = active_holds().filter(product_id__in=product_ids)
+    if exclude_cart is not None:
+        holds = holds.exclude(cart=exclude_cart)
+    return dict(
+        holds.values('product_id').annotate(held=Sum('quantity')).values_list('product_id', 'held')
+    )
+
+
+def with_available_stock(queryset):
+    """Annote `available_stock` (stock moins réservations actives) sur un queryset de produits"""
+    held = active_holds().filter(product=OuterRef('pk')).values('product').annotate(
+        held=Sum('quantity')
+    ).values('held')
+    return queryset.annotate(available_stock=Greatest(
+        F('stock') - Coalesce(Subquery(held, output_field=IntegerField()), Value(0)),
+        Value(0),
+        output_field=IntegerField(),
+    ))
+
+
+def available_stock(product):
+    """Stock disponible d'un produit (une requête agrégée sur l'index des réservations)"""
+    held = held_quantities([product.id]).get(product.id, 0)
+    return max(product.stock - held, 0)
+
+
+class ReservationResult:
+    """Résultat de reserve_cart() : échéance et produits non réservables"""
+
+    def __init__(self, expires_at, shortages):
+        self.expires_at = expires_at
+        self.shortages = shortages
+
+    def __bool__(self):
+        return not self.shortages
+
+
+def reserve_cart(cart):
+    """
+    Réserve (ou prolonge) les quantités du panier
+
+    Les produits sont verrouillés brièvement, par ordre d'id, le temps de
+    comparer le stock aux réservations des autres paniers ; c'est le seul
+    point de sérialisation, hors du paiement. Les lignes non réservables
+    sont listées dans `shortages` (noms de produits).
+    """
+    expires_at = timezone.now() + reservation_ttl()
+    with transaction.atomic():
+        quantities = dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity'))
+        products = list(
+            Product.objects.select_for_update(of=('self',))
+            .filter(id__in=quantities)
+            .order_by('id')
+            .only('id', 'name', 'stock', 'is_available')
+        )
+        held = held_quantities(quantities, exclude_cart=cart)
+
+        holds = []
+        shortages = []
+        for product in products:
+            quantity = quantities[product.id]
+            if product.is_available and product.stock - held.get(product.id, 0) >= quantity:
+                holds.append(StockReservation(
+                    cart=cart, product=product, quantity=quantity, expires_at=expires_at,
+                ))
+            else:
+                shortages.append(product.name)
+
+        StockReservation.objects.filter(cart=cart).exclude(
+            product_id__in=[hold.product_id for hold in holds]
+        ).delete()
+        StockReservation.objects.bulk_create(
+            holds,
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'expires_at'],
+        )
+    return ReservationResult(expires_at, shortages)
+
+
+def consume_reservations(cart, quantities):
+    """
+    Consomme les réservations du panier au paiement
+
+    Retourne False, sans rien modifier, si les réservations actives ne
+    couvrent pas exactement `quantities` ({product_id: quantité}) ; sinon
+    les supprime et retourne True. À appeler dans la transaction du
+    paiement, qui décrémente Product.stock des mêmes quantités.
+    """
+    holds = list(
+        StockReservation.objects.select_for_update()
+        .filter(cart=cart, expires_at__gt=timezone.now())
+        .only('id', 'product_id', 'quantity')
+    )
+    covered = {hold.product_id: hold.quantity for hold in holds}
+    if covered != quantities:
+        return False
+    StockReservation.objects.filter(id__in=[hold.id for hold in holds]).delete()
+    return True
+
+
+def release_cart_reservations(cart):
+    """Libère les réservations en cours d'un panier"""
+    StockReservation.objects.filter(cart=cart).delete()
+
+
+def restock_orders(order_ids, withdraw=False):
+    """
+    Remet en stock les quantités des commandes annulées `order_ids`
+
+    Seules les commandes dont le paiement a décrémenté le stock
+    (stock_status « taken ») sont concernées ; elles passent à « returned ».
+    `withdraw=True` fait l'inverse pour les commandes « returned »
+    (réactivées depuis l'admin), sans descendre sous zéro. Un UPDATE pour
+    tous les produits concernés ; à appeler dans la transaction du
+    changement de statut. Retourne le nombre de produits mis à jour.
+    """
+    source, target = ('returned', 'taken') if withdraw else ('taken', 'returned')
+    order_ids = list(
+        Order.objects.select_for_update()
+        .filter(id__in=order_ids, stock_status=source)
+        .values_list('id', flat=True)
+    )
+    if not order_ids:
+        return 0
+    Order.objects.filter(id__in=order_ids).update(stock_status=target)
+
+    totals = dict(
+        OrderItem.objects.filter(order_id__in=order_ids).values('product_id').annotate(
+            quantity=Sum('quantity'),
+        ).values_list('product_id', 'quantity')
+    )
+    if not totals:
+        return 0
+    if withdraw:
+        whens = [When(id=product_id, then=Greatest(F('stock') - quantity, 0)) for product_id, quantity in sorted(totals.items())]
+    else:
+        whens = [When(id=product_id, then=F('stock') + quantity) for product_id, quantity in sorted(totals.items())]
+    Product.objects.filter(id__in=list(totals)).update(stock=Case(
+        *whens,
+        default=F('stock'),
+        output_field=PositiveIntegerField(),
+    ))
+    return len(totals)
+
+
+def sweep_reservations(batch_size=SWEEP_BATCH_SIZE):
+    """
+    Supprime les réservations expirées
+
+    Travaille par lots de `batch_size` lignes, chacun supprimé par sa propre
+    requête. Retourne le nombre de réservations supprimées.
+    """
+    expired = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(expires_at__lte=timezone.now())
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        deleted, _details = StockReservation.objects.filter(
+            id__in=ids, expires_at__lte=timezone.now()
+        ).delete()
+        expired += deleted
+    return expired
@@ -0,0 +1,167 @@
+"""
+File de tâches d'arrière-plan stockée en base
+
+- `@task('nom')` enregistre une fonction exécutable par les workers ;
+- `enqueue('nom', **payload)` insère la tâche après le commit de la
+  transaction en cours (rien n'est mis en file si elle est annulée) ;
+- `run_jobs` (commande de gestion) prend les tâches par lots :
+  SELECT ... FOR UPDATE SKIP LOCKED sous PostgreSQL, et sur les bases
+  sans SKIP LOCKED (SQLite) un UPDATE conditionnel sur le statut qui ne
+  réussit que pour un seul worker.
+
+Une tâche en échec est replanifiée avec un délai exponentiel
+(JOB_RETRY_BASE_DELAY * 2^tentatives, plafonné) jusqu'à max_attempts.
+Une tâche restée « en cours » au-delà de JOB_LOCK_TIMEOUT (worker tué)
+est reprise par un autre worker ; les tâches doivent donc être rejouables.
+"""
+
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+DEFAULT_QUEUE = 'default'
+
+
+def task(name, max_attempts=5, queue=DEFAULT_QUEUE):
+    """Décorateur : enregistre `func` comme tâche nommée"""
+    def decorator(func):
+        func.task_name = name
+        func.max_attempts = max_attempts
+        func.queue = queue
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    if name not in TASKS:
+        # Les tâches sont déclarées dans core.tasks
+        from . import tasks  # noqa: F401
+    return TASKS[name]
+
+
+def enqueue(name, delay=0, **payload):
+    """
+    Met la tâche `name` en file avec `payload` (sérialisable en JSON)
+
+    Dans une transaction, l'insertion est différée jusqu'au commit.
+    """
+    func = get_task(name)
+
+    def insert():
+        Job.objects.create(
+            queue=func.queue,
+            task=name,
+            payload=payload,
+            max_attempts=func.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+    transaction.on_commit(insert)
+
+
+def retry_delay(attempts):
+    """Délai avant la tentative suivante (exponentiel, plafonné, avec gigue)"""
+    base = getattr(settings, 'JOB_RETRY_BASE_DELAY', 10)
+    ceiling = getattr(settings, 'JOB_RETRY_MAX_DELAY', 3600)
+    delay = min(base * 2 ** max(attempts - 1, 0), ceiling)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _claimable(queue, now):
+    stale = now - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+    return Job.objects.filter(queue=queue).filter(
+        Q(status='pending', run_at__lte=now) | Q(status='running', locked_at__lt=stale)
+    )
+
+
+def claim_jobs(queue=DEFAULT_QUEUE, limit=10, worker=None):
+    """Réserve jusqu'à `limit` tâches pour ce worker et les retourne"""
+    worker = worker or worker_name()
+    now = timezone.now()
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(
+                _claimable(queue, now)
+                .select_for_update(skip_locked=True)
+                .order_by('run_at', 'id')
+                .values_list('id', flat=True)[:limit]
+            )
+            Job.objects.filter(id__in=ids).update(
+                status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+            )
+    else:
+        # Pas de SKIP LOCKED : chaque tâche est prise par un UPDATE conditionnel,
+        # seul le premier worker voit une ligne modifiée
+        ids = []
+        candidates = _claimable(queue, now).order_by('run_at', 'id').values_list(
+            'id', 'status', 'locked_at'
+        )[:limit]
+        for job_id, status, locked_at in candidates:
+            taken = Job.objects.filter(id=job_id, status=status, locked_at=locked_at).update(
+                status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+            )
+            if taken:
+                ids.append(job_id)
+
+    return list(Job.objects.filter(id__in=ids).order_by('run_at', 'id'))
+
+
+def run_job(job):
+    """Exécute une tâche réservée et enregistre son issue"""
+    try:
+        get_task(job.task)(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error("Tâche %s abandonnée après %s tentatives", job, job.attempts)
+            Job.objects.filter(id=job.id).update(
+                status='failed', last_error=error, locked_by='', locked_at=None,
+                updated_at=timezone.now(),
+            )
+        else:
+            logger.warning("Tâche %s en échec (tentative %s)", job, job.attempts)
+            Job.objects.filter(id=job.id).update(
+                status='pending', last_error=error, locked_by='', locked_at=None,
+                run_at=timezone.now() + retry_delay(job.attempts), updated_at=timezone.now(),
+            )
+        return False
+
+    Job.objects.filter(id=job.id).update(
+        status='done', locked_by='', locked_at=None, updated_at=timezone.now(),
+    )
+    return True
+
+
+def work(queue=DEFAULT_QUEUE, batch_size=10, worker=None):
+    """Prend et exécute un lot ; retourne le nombre de tâches traitées"""
+    jobs = claim_jobs(queue, batch_size, worker)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
+
+
+def purge_jobs(older_than_days=7):
+    """Supprime les tâches terminées anciennes"""
+    limit = timezone.now() - timedelta(days=older_than_days)
+    deleted, _details = Job.objects.filter(status='done', updated_at__lt=limit).delete()
+    return deleted
@@ -0,0 +1,48 @@
+"""
+Recalcule les cumuls de ventes journaliers depuis les commandes
+
+À lancer après la migration qui crée les tables, après un import de
+commandes ou pour corriger une dérive (par défaut, de la première commande
+à aujourd'hui).
+
+    python manage.py backfill_sales_rollups
+    python manage.py backfill_sales_rollups --from 2024-03-01 --to 2024-03-31
+    python manage.py backfill_sales_rollups --days 2      # hier et aujourd'hui (cron)
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.sales import BACKFILL_CHUNK_DAYS, rebuild_sales_rollups
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Date invalide (AAAA-MM-JJ attendu) : {value}")
+
+
+class Command(BaseCommand):
+    help = "Recalcule les cumuls de ventes journaliers (totaux, produits, catégories)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="Premier jour (AAAA-MM-JJ)")
+        parser.add_argument('--to', dest='date_to', help="Dernier jour inclus (AAAA-MM-JJ)")
+        parser.add_argument('--days', type=int, help="Les N derniers jours, aujourd'hui compris")
+        parser.add_argument('--chunk-days', type=int, default=BACKFILL_CHUNK_DAYS,
+                            help="Jours recalculés par transaction")
+
+    def handle(self, *args, **options):
+        date_from = parse_date(options['date_from']) if options['date_from'] else None
+        date_to = parse_date(options['date_to']) if options['date_to'] else None
+        if options['days']:
+            date_to = timezone.localdate()
+            date_from = date_to - datetime.timedelta(days=options['days'] - 1)
+        if date_from and date_to and date_from > date_to:
+            raise CommandError("--from doit précéder --to")
+
+        days = rebuild_sales_rollups(date_from, date_to, options['chunk_days'])
+        self.stdout.write(self.style.SUCCESS(f"Cumuls de ventes recalculés : {days} jour(s) avec des ventes"))
@@ -0,0 +1,60 @@
+"""
+Exporte les commandes ou les lignes de commande en CSV / JSON Lines
+
+Les filtres sont appliqués en SQL et les lignes lues par morceaux : la
+mémoire reste constante quel que soit le volume exporté.
+
+    python manage.py export_orders --from 2024-03-01 --to 2024-03-31 --lines -o mars.csv
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import EXPORT_CHUNK_SIZE, FORMATS, export_chunks, filter_orders
+from core.models import Order
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Date invalide (AAAA-MM-JJ attendu) : {value}")
+
+
+class Command(BaseCommand):
+    help = "Exporte les commandes (ou leurs lignes) en CSV ou JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument(
+            '--lines', action='store_true',
+            help="Exporte les lignes de commande plutôt que les commandes",
+        )
+        parser.add_argument('--from', dest='date_from', help="Première date incluse (AAAA-MM-JJ)")
+        parser.add_argument('--to', dest='date_to', help="Dernière date incluse (AAAA-MM-JJ)")
+        parser.add_argument(
+            '--status', action='append', dest='statuses',
+            choices=[value for value, _label in Order.STATUS_CHOICES],
+            help="Limite l'export à ce statut (option répétable)",
+        )
+        parser.add_argument('-o', '--output', help="Fichier de sortie (sortie standard par défaut)")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        date_from = parse_date(options['date_from']) if options['date_from'] else None
+        date_to = parse_date(options['date_to']) if options['date_to'] else None
+        orders = filter_orders(Order.objects.all(), date_from, date_to, options['statuses'])
+        chunks = export_chunks(orders, options['format'], options['lines'], options['chunk_size'])
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        rows = -1 if options['format'] == 'csv' else 0
+        with open(options['output'], 'w', encoding='utf-8', newline='') as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+                rows += 1
+        self.stderr.write(self.style.SUCCESS(f"{max(rows, 0)} ligne(s) exportée(s) vers {options['output']}"))
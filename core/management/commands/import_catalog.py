@@ -0,0 +1,69 @@
+"""
+Importe un flux catalogue fournisseur (CSV ou JSON Lines) par lots
+
+Colonnes : slug, name, category (slug), price, discount_price, description,
+stock, is_available, brand, weight, dimensions, meta_title,
+meta_description, image (chemin relatif à --images-dir). Les produits
+sont créés ou mis à jour par slug (voir core.catalog_import).
+
+    python manage.py import_catalog fournisseur.csv --images-dir ./photos
+    python manage.py import_catalog flux.jsonl --workers 4 --batch-size 2000
+"""
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.catalog_import import DEFAULT_BATCH_SIZE, import_catalog
+
+
+class Command(BaseCommand):
+    help = "Importe (crée ou met à jour) des produits depuis un fichier CSV ou JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Par défaut : d'après l'extension")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--images-dir', help="Dossier des images (défaut : celui du fichier)")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Processus d'analyse et de validation des lignes")
+        parser.add_argument('--create-categories', action='store_true',
+                            help="Crée les catégories inconnues au lieu de rejeter les lignes")
+        parser.add_argument('--dry-run', action='store_true', help="Valide le fichier sans rien écrire")
+        parser.add_argument('--show-errors', type=int, default=20,
+                            help="Nombre d'erreurs détaillées dans le rapport")
+
+    def handle(self, *args, **options):
+        if not os.path.isfile(options['path']):
+            raise CommandError(f"Fichier introuvable : {options['path']}")
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError("--batch-size et --workers doivent être positifs")
+
+        def on_batch(report):
+            self.stdout.write(
+                f"{report.read} ligne(s) lue(s), {report.created} créée(s), {report.updated} mise(s) à jour, "
+                f"{len(report.errors)} erreur(s) — {report.rate:.0f} lignes/s"
+            )
+
+        report = import_catalog(
+            options['path'],
+            fmt=options['format'],
+            batch_size=options['batch_size'],
+            images_dir=options['images_dir'],
+            workers=options['workers'],
+            create_categories=options['create_categories'],
+            dry_run=options['dry_run'],
+            on_batch=on_batch,
+        )
+
+        for error in report.errors[:options['show_errors']]:
+            self.stderr.write(f"  {error}")
+        if len(report.errors) > options['show_errors']:
+            self.stderr.write(f"  ... et {len(report.errors) - options['show_errors']} autre(s)")
+
+        prefix = "Validation" if options['dry_run'] else "Import"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} terminé en {report.elapsed:.1f}s ({report.rate:.0f} lignes/s) : "
+            f"{report.read} ligne(s), {report.created} créée(s), {report.updated} mise(s) à jour, "
+            f"{len(report.errors)} rejetée(s)"
+        ))
@@ -0,0 +1,24 @@
+"""
+Recalcule les statistiques clients (CustomerStats) depuis les commandes
+
+À lancer après la migration qui crée la table, après un import de
+commandes ou pour corriger une dérive.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.customer_stats import rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques de commandes par client"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help="Limite le calcul à ce client (option répétable)",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_customer_stats(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Statistiques recalculées pour {count} client(s)"))
@@ -0,0 +1,20 @@
+"""
+Reconstruit l'index de recherche plein texte du catalogue
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.models import Product
+from core.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des produits"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.index_products()
+        self.stdout.write(self.style.SUCCESS(
+            f"Index reconstruit ({type(backend).__name__}) : "
+            f"{Product.objects.count()} produits"
+        ))
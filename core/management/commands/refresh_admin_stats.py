@@ -0,0 +1,20 @@
+"""
+Recalcule l'instantané des statistiques du tableau de bord d'administration
+
+À planifier (cron) pour que l'admin affiche toujours des chiffres récents.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.dashboard import refresh_admin_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques du tableau de bord d'administration"
+
+    def handle(self, *args, **options):
+        snapshot = refresh_admin_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Statistiques actualisées : {snapshot['user_count']} utilisateurs, "
+            f"{snapshot['order_count']} commandes, {snapshot['revenue']} € de chiffre d'affaires"
+        ))
@@ -0,0 +1,71 @@
+"""
+Relaie les événements de commande de l'outbox vers le sink configuré
+
+    python manage.py relay_outbox                     # sink OUTBOX_SINK
+    python manage.py relay_outbox --sink file:/tmp/events.jsonl --once
+    python manage.py relay_outbox --sink http://localhost:9000/events
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.outbox import (
+    DEFAULT_BATCH_SIZE, SinkError, get_sink, pending_events, purge_delivered, relay_batch,
+    sink_from_url,
+)
+
+
+class Command(BaseCommand):
+    help = "Transmet les événements de commande en attente (outbox) au sink"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sink', help="file:/chemin, http(s)://url ou log: (défaut : OUTBOX_SINK)")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=1.0, help="Pause quand l'outbox est vide (s)")
+        parser.add_argument('--max-backoff', type=float, default=60.0,
+                            help="Pause maximale après des échecs successifs du sink (s)")
+        parser.add_argument('--once', action='store_true', help="S'arrête quand l'outbox est vide")
+        parser.add_argument('--purge-days', type=int, default=None,
+                            help="Supprime d'abord les événements livrés depuis N jours")
+
+    def handle(self, *args, **options):
+        try:
+            sink = sink_from_url(options['sink']) if options['sink'] else get_sink()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['purge_days'] is not None:
+            purged = purge_delivered(options['purge_days'])
+            self.stdout.write(f"{purged} événement(s) livré(s) supprimé(s)")
+
+        delivered = 0
+        backoff = options['sleep']
+        try:
+            while True:
+                try:
+                    count = relay_batch(sink, options['batch_size'])
+                except SinkError as exc:
+                    # Contre-pression : on cesse de lire tant que le sink refuse
+                    self.stderr.write(f"Sink indisponible ({exc}), nouvel essai dans {backoff:.0f}s")
+                    if options['once']:
+                        break
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, options['max_backoff'])
+                    continue
+
+                backoff = options['sleep']
+                delivered += count
+                if count:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sink.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{delivered} événement(s) livré(s), {pending_events().count()} en attente"
+        ))
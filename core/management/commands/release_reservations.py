@@ -0,0 +1,33 @@
+"""
+Libère les réservations de stock expirées
+
+À lancer périodiquement (cron, toutes les minutes par exemple).
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.inventory import SWEEP_BATCH_SIZE, sweep_reservations
+
+
+class Command(BaseCommand):
+    help = "Supprime les réservations de stock expirées"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=SWEEP_BATCH_SIZE,
+            help="Nombre de réservations traitées par transaction",
+        )
+        parser.add_argument(
+            '--loop', type=int, default=0, metavar='SECONDES',
+            help="Répète le balayage toutes les N secondes au lieu d'une seule passe",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired = sweep_reservations(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"{expired} réservation(s) expirée(s) libérée(s)"))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
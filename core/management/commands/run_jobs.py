@@ -0,0 +1,101 @@
+"""
+Worker de la file de tâches (core.jobs)
+
+    python manage.py run_jobs --processes 2 --threads 4
+
+Chaque fil d'exécution prend ses tâches par lots ; plusieurs workers
+(fils, processus ou machines) peuvent tourner en parallèle sans se
+marcher dessus.
+"""
+
+import multiprocessing
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+
+from core.jobs import DEFAULT_QUEUE, purge_jobs, work, worker_name
+
+
+def worker_loop(queue, batch_size, sleep, once, stop):
+    """Boucle d'un fil : lots successifs, pause quand la file est vide"""
+    name = f'{worker_name()}:{threading.get_ident()}'
+    processed = 0
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            count = work(queue, batch_size, name)
+            processed += count
+            if once and not count:
+                break
+            if not count:
+                stop.wait(sleep)
+    finally:
+        connection.close()
+    return processed
+
+
+def process_main(queue, batch_size, sleep, once, threads):
+    """Point d'entrée d'un processus worker : lance `threads` fils"""
+    stop = threading.Event()
+    workers = [
+        threading.Thread(target=worker_loop, args=(queue, batch_size, sleep, once, stop), daemon=True)
+        for _ in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+
+
+class Command(BaseCommand):
+    help = "Exécute les tâches d'arrière-plan en file d'attente"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default=DEFAULT_QUEUE, help="File à traiter")
+        parser.add_argument('--processes', type=int, default=1, help="Nombre de processus")
+        parser.add_argument('--threads', type=int, default=1, help="Nombre de fils par processus")
+        parser.add_argument('--batch-size', type=int, default=10, help="Tâches prises par lot")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Pause quand la file est vide (s)")
+        parser.add_argument('--once', action='store_true', help="S'arrête quand la file est vide")
+        parser.add_argument('--purge-days', type=int, default=None,
+                            help="Supprime d'abord les tâches terminées depuis N jours")
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            purged = purge_jobs(options['purge_days'])
+            self.stdout.write(f"{purged} tâche(s) terminée(s) supprimée(s)")
+
+        worker_args = (
+            options['queue'], options['batch_size'], options['sleep'],
+            options['once'], max(options['threads'], 1),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Worker démarré sur la file « {options['queue']} » "
+            f"({options['processes']} processus x {options['threads']} fil(s))"
+        ))
+
+        if options['processes'] <= 1:
+            process_main(*worker_args)
+            return
+
+        # Les connexions ne doivent pas être partagées avec les processus enfants
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=process_main, args=worker_args)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            time.sleep(0.5)
@@ -0,0 +1,84 @@
+"""
+Change le statut de commandes en masse, par lots (voir core.order_status)
+
+    python manage.py transition_orders shipped --file expedies.txt   # un numéro par ligne
+    python manage.py transition_orders shipped --order-number 20240315-000042
+    python manage.py transition_orders delivered --from-status shipped --before 2024-03-01
+"""
+
+import datetime
+from itertools import chain, islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Order
+from core.order_status import TRANSITIONS, TransitionReport, transition_orders
+
+
+def read_numbers(path):
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            number = line.strip()
+            if number and not number.startswith('#'):
+                yield number
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Passe des commandes à un nouveau statut, par lots, avec historique"
+
+    def add_arguments(self, parser):
+        parser.add_argument('status', choices=list(TRANSITIONS))
+        parser.add_argument('--file', help="Fichier de numéros de commande (un par ligne)")
+        parser.add_argument('--order-number', action='append', dest='order_numbers', default=[],
+                            help="Numéro de commande (option répétable)")
+        parser.add_argument('--from-status', choices=list(TRANSITIONS),
+                            help="Toutes les commandes ayant ce statut")
+        parser.add_argument('--before', help="Avec --from-status : commandes créées avant cette date (AAAA-MM-JJ)")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Commandes par transaction (défaut : ORDER_TRANSITION_BATCH_SIZE)")
+
+    def handle(self, *args, **options):
+        status = options['status']
+        if not (options['file'] or options['order_numbers'] or options['from_status']):
+            raise CommandError("Indiquez --file, --order-number ou --from-status")
+
+        total = TransitionReport(status)
+
+        def on_batch(number, count):
+            self.stdout.write(f"Lot {len(total.batches) + 1} : {count} commande(s) passée(s) en {status}")
+            total.batches.append(count)
+
+        def run(queryset):
+            report = transition_orders(
+                queryset, status, batch_size=options['batch_size'], source='command', on_batch=on_batch,
+            )
+            total.skipped += report.skipped
+
+        if options['from_status']:
+            queryset = Order.objects.filter(status=options['from_status'])
+            if options['before']:
+                try:
+                    before = datetime.date.fromisoformat(options['before'])
+                except ValueError:
+                    raise CommandError(f"Date invalide (AAAA-MM-JJ attendu) : {options['before']}")
+                queryset = queryset.filter(created_at__date__lt=before)
+            run(queryset)
+
+        # Les numéros sont lus par paquets : la clause IN reste bornée
+        numbers = options['order_numbers']
+        if options['file']:
+            numbers = chain(numbers, read_numbers(options['file']))
+        chunk_size = options['batch_size'] or 1000
+        for chunk in chunked(numbers, chunk_size):
+            run(Order.objects.filter(order_number__in=chunk))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total.updated} commande(s) passée(s) en {status} en {len(total.batches)} lot(s), "
+            f"{total.skipped} ignorée(s) (transition non autorisée)"
+        ))
@@ -0,0 +1,16 @@
+"""
+Middlewares de l'application e-commerce
+"""
+
+from .cart import save_cookie_cart
+
+
+class CookieCartMiddleware:
+    """Écrit le cookie signé du panier anonyme lorsqu'il a été modifié"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return save_cookie_cart(request, response)
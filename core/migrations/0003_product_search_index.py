@@ -0,0 +1,55 @@
+# Index de recherche plein texte, spécifique à chaque base de données
+
+from django.db import migrations
+
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('french', coalesce(p.name, '')), 'A') || "
+    "setweight(to_tsvector('french', coalesce(p.brand, '')), 'B') || "
+    "setweight(to_tsvector('french', coalesce(c.name, '')), 'C') || "
+    "setweight(to_tsvector('french', coalesce(p.description, '')), 'D')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE core_product ADD COLUMN search_vector tsvector')
+        schema_editor.execute(
+            'CREATE INDEX core_product_search_gin ON core_product USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            f'UPDATE core_product p SET search_vector = {POSTGRES_VECTOR} '
+            'FROM core_category c WHERE c.id = p.category_id'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE core_product_fts USING fts5('
+            'name, brand, description, category, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            'INSERT INTO core_product_fts (rowid, name, brand, description, category) '
+            'SELECT p.id, p.name, p.brand, p.description, c.name '
+            'FROM core_product p JOIN core_category c ON c.id = p.category_id'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS core_product_search_gin')
+        schema_editor.execute('ALTER TABLE core_product DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS core_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_product_final_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
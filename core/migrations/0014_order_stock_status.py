@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_admin_stats_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_status',
+            field=models.CharField(choices=[('untracked', 'Non suivi'), ('taken', 'Déduit du stock'), ('returned', 'Remis en stock')], default='untracked', editable=False, max_length=10),
+        ),
+    ]
@@ -0,0 +1,51 @@
+"""
+Remplit CustomerStats depuis les commandes existantes
+
+La table créée par 0010 n'est ensuite tenue à jour qu'au fil des commandes :
+sans ce rattrapage, les statistiques des clients et les totaux du tableau
+de bord d'administration partiraient de zéro sur une base existante. Même
+calcul que core.customer_stats.rebuild_customer_stats(), sur les modèles
+historiques.
+"""
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_customer_stats(apps, schema_editor):
+    Order = apps.get_model('core', 'Order')
+    CustomerStats = apps.get_model('core', 'CustomerStats')
+
+    delivered = Q(status='delivered')
+    rows = Order.objects.values('user_id').annotate(
+        order_count=Count('id'),
+        total_ordered=Sum('total_amount'),
+        delivered_count=Count('id', filter=delivered),
+        lifetime_spend=Coalesce(Sum('total_amount', filter=delivered), Value(Decimal('0'))),
+        last_order_at=Max('created_at'),
+    ).order_by()
+
+    CustomerStats.objects.bulk_create(
+        [CustomerStats(**row) for row in rows.iterator(chunk_size=2000)],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=[
+            'order_count', 'total_ordered', 'delivered_count',
+            'lifetime_spend', 'last_order_at', 'updated_at',
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_order_stock_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_customer_stats, migrations.RunPython.noop),
+    ]
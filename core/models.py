@@ -3,7 +3,9 @@ Modèles de données pour l'application e-commerce
 """
 
 from django.db import models
+from django.db.models import Case, When, F
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 class User(AbstractUser):
@@ -75,6 +77,22 @@ class Product(models.Model):
     weight = models.DecimalField(max_digits=6, decimal_places=2, blank=True, null=True)
     dimensions = models.CharField(max_length=50, blank=True)
 
+    # Prix effectif calculé par la base de données : toujours synchronisé avec
+    # price/discount_price, y compris après un queryset.update() ou une
+    # édition via list_editable. Permet de trier et filtrer par prix en SQL.
+    # Django ne relit pas la valeur après save() : save() la retire de
+    # l'instance pour qu'elle soit rechargée au prochain accès. Les objets
+    # passés à bulk_create()/bulk_update() gardent l'ancienne valeur.
+    final_price = models.GeneratedField(
+        expression=Case(
+            When(discount_price__gt=0, then=F('discount_price')),
+            default=F('price'),
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+        verbose_name="Prix final",
+    )
+
     class Meta:
         verbose_name = "Produit"
         verbose_name_plural = "Produits"
@@ -83,15 +101,17 @@ class Product(models.Model):
             models.Index(fields=['name']),
             models.Index(fields=['price']),
             models.Index(fields=['category']),
+            # Filtrage par fourchette de prix + tri par prix des produits disponibles
+            models.Index(fields=['is_available', 'final_price'], name='core_produc_avail_price_idx'),
         ]
 
     def __str__(self):
         return self.name
 
-    @property
-    def final_price(self):
-        """Retourne le prix final après réduction"""
-        return self.discount_price if self.discount_price else self.price
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Valeur calculée par la base : rechargée (une requête) au prochain accès
+        self.__dict__.pop('final_price', None)
 
     @property
     def has_discount(self):
@@ -144,13 +164,14 @@ class Cart(models.Model):
 
     @property
     def total_price(self):
-        """Calcule le prix total du panier"""
-        return sum(item.total_price for item in self.items.all())
+        """Calcule le prix total du panier (agrégation SQL, voir core.cart)"""
+        from .cart import cart_totals
+        return cart_totals(self)['total_price']
 
     @property
     def total_items(self):
-        """Calcule le nombre total d'articles dans le panier"""
-        return sum(item.quantity for item in self.items.all())
+        """Calcule le nombre total d'articles dans le panier (agrégation SQL)"""
+        return self.items.aggregate(total=models.Sum('quantity'))['total'] or 0
 
 class CartItem(models.Model):
     """Modèle pour les articles dans le panier"""
@@ -190,6 +211,15 @@ class Order(models.Model):
         ('cash_on_delivery', 'Paiement à la livraison'),
     ]
 
+    # Mouvement de stock de la commande (core.inventory) : seules les
+    # commandes dont le paiement a décrémenté le stock le rendent à
+    # l'annulation ; commandes antérieures et saisies dans l'admin : non suivi
+    STOCK_STATUS_CHOICES = [
+        ('untracked', 'Non suivi'),
+        ('taken', 'Déduit du stock'),
+        ('returned', 'Remis en stock'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     order_number = models.CharField(max_length=20, unique=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -198,6 +228,11 @@ class Order(models.Model):
     shipping_address = models.TextField()
     billing_address = models.TextField()
     notes = models.TextField(blank=True)
+    # Clé fournie par le client pour rejouer une soumission sans doublon
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    stock_status = models.CharField(
+        max_length=10, choices=STOCK_STATUS_CHOICES, default='untracked', editable=False,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -205,10 +240,36 @@ class Order(models.Model):
         verbose_name = "Commande"
         verbose_name_plural = "Commandes"
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='core_order_idempotency_uniq'),
+        ]
+        indexes = [
+            # Historique client paginé par curseur (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='core_order_user_created_idx'),
+            # Exports et recalcul des cumuls de ventes par période
+            models.Index(fields=['created_at'], name='core_order_created_idx'),
+        ]
 
     def __str__(self):
         return f"Commande {self.order_number} - {self.user.username}"
 
+class OrderNumberCounter(models.Model):
+    """
+    Compteur journalier des numéros de commande
+
+    Chaque processus y réserve des blocs de numéros (schéma hi/lo, voir
+    core.order_numbers) : la ligne n'est écrite qu'une fois par bloc.
+    """
+    day = models.DateField(unique=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Compteur de commandes"
+        verbose_name_plural = "Compteurs de commandes"
+
+    def __str__(self):
+        return f"{self.day} : {self.next_value}"
+
 class OrderItem(models.Model):
     """Modèle pour les articles dans une commande"""
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -229,6 +290,227 @@ class OrderItem(models.Model):
         """Calcule le prix total pour cet article de commande"""
         return self.quantity * self.price
 
+class StockReservation(models.Model):
+    """
+    Réservation de stock (« hold ») prise par un panier à l'entrée du paiement
+
+    Tant qu'elle n'a pas expiré, la quantité réservée est déduite du stock
+    disponible des autres clients. Au paiement, la réservation est supprimée
+    et Product.stock décrémenté dans la même transaction ; expirée, elle est
+    supprimée par la commande `release_reservations`.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Réservation de stock"
+        verbose_name_plural = "Réservations de stock"
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='core_reservation_cart_product_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='core_reservation_product_idx'),
+            models.Index(fields=['expires_at'], name='core_reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} (expire {self.expires_at})"
+
+class Job(models.Model):
+    """
+    Tâche d'arrière-plan en file d'attente (voir core.jobs)
+
+    Les tâches sont prises par la commande `run_jobs` ; un échec repasse la
+    tâche en attente avec un délai croissant jusqu'à max_attempts.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminée'),
+        ('failed', 'En échec'),
+    ]
+
+    queue = models.CharField(max_length=50, default='default')
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Tâche"
+        verbose_name_plural = "Tâches"
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_at'], name='core_job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+class OutboxEvent(models.Model):
+    """
+    Événement de commande à transmettre aux systèmes externes (entrepôt, ERP)
+
+    Écrit dans la même transaction que la modification de la commande, puis
+    relayé par la commande `relay_outbox` (voir core.outbox).
+    """
+    event_type = models.CharField(max_length=50)
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='events')
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Événement sortant"
+        verbose_name_plural = "Événements sortants"
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['id'], name='core_outbox_pending_idx',
+                condition=models.Q(delivered_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.pk}"
+
+class OrderStatusHistory(models.Model):
+    """
+    Historique des changements de statut d'une commande
+
+    Une ligne par transition, écrite dans la même transaction que la
+    commande (voir core.order_status).
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_history')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    source = models.CharField(max_length=20, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Changement de statut"
+        verbose_name_plural = "Changements de statut"
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='core_status_history_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} : {self.from_status} → {self.to_status}"
+
+class CustomerStats(models.Model):
+    """
+    Statistiques de commandes par client, tenues à jour au fil de l'eau
+
+    Mises à jour par core.customer_stats à chaque commande passée et à chaque
+    changement de statut ; la commande `rebuild_customer_stats` les recalcule
+    depuis les commandes (reprise, correction de dérive).
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='order_stats')
+    order_count = models.PositiveIntegerField(default=0)
+    total_ordered = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    delivered_count = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Statistiques client"
+        verbose_name_plural = "Statistiques clients"
+
+    def __str__(self):
+        return f"Statistiques de {self.user_id}"
+
+class AdminStatsSnapshot(models.Model):
+    """
+    Instantané des statistiques du tableau de bord d'administration
+
+    Une seule ligne (pk=1), écrite par core.dashboard : stockée en base pour
+    que le recalcul fait par un worker soit visible de tous les processus web.
+    """
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    generated_at = models.DateTimeField()
+    refresh_requested_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Instantané des statistiques"
+        verbose_name_plural = "Instantanés des statistiques"
+
+    def __str__(self):
+        return f"Statistiques du {self.generated_at}"
+
+class SalesRollup(models.Model):
+    """
+    Cumuls de ventes d'une journée (commandes non annulées)
+
+    Tenus à jour par core.sales au fil des commandes et recalculés par la
+    commande `backfill_sales_rollups`. Les compteurs sont signés : une
+    annulation est un delta négatif.
+    """
+    day = models.DateField()
+    order_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+class DailySales(SalesRollup):
+    """Ventes totales par jour"""
+
+    class Meta:
+        verbose_name = "Ventes du jour"
+        verbose_name_plural = "Ventes par jour"
+        constraints = [
+            models.UniqueConstraint(fields=['day'], name='core_daily_sales_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} : {self.revenue}"
+
+class DailyProductSales(SalesRollup):
+    """Ventes par jour et par produit"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+
+    class Meta:
+        verbose_name = "Ventes du jour par produit"
+        verbose_name_plural = "Ventes par jour et par produit"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='core_daily_product_sales_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} / {self.product_id} : {self.revenue}"
+
+class DailyCategorySales(SalesRollup):
+    """Ventes par jour et par catégorie"""
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+
+    class Meta:
+        verbose_name = "Ventes du jour par catégorie"
+        verbose_name_plural = "Ventes par jour et par catégorie"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='core_daily_category_sales_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} / {self.category_id} : {self.revenue}"
+
 class UserProfile(models.Model):
     """Modèle pour le profil utilisateur étendu"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -0,0 +1,90 @@
+"""
+Allocation des numéros de commande (schéma hi/lo)
+
+Chaque processus réserve un bloc de ORDER_NUMBER_BLOCK_SIZE numéros du jour
+en une seule requête atomique sur le compteur journalier
+(INSERT ... ON CONFLICT DO UPDATE ... RETURNING), puis les distribue en
+mémoire. Aucune boucle de nouvelle tentative ni verrou global : deux
+processus obtiennent toujours des blocs disjoints.
+
+Les numéros sont croissants au sein d'un processus ; un bloc entamé est
+perdu au redémarrage, les trous dans la numérotation sont donc normaux.
+Format : AAAAMMJJ-NNNNNN (ex. 20240315-000042).
+"""
+
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OrderNumberCounter
+
+DEFAULT_BLOCK_SIZE = 50
+
+
+def reserve_block(day, size):
+    """Réserve `size` numéros pour `day` ; retourne l'intervalle [lo, hi)"""
+    table = OrderNumberCounter._meta.db_table
+    if connection.vendor in ('postgresql', 'sqlite'):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (day, next_value) VALUES (%s, %s) '
+                f'ON CONFLICT (day) DO UPDATE '
+                f'SET next_value = {table}.next_value + excluded.next_value - 1 '
+                f'RETURNING next_value',
+                [day, size + 1],
+            )
+            hi = cursor.fetchone()[0]
+        return hi - size, hi
+
+    # Autres bases : verrou de ligne bref, le temps d'avancer le compteur
+    with transaction.atomic():
+        counter, _created = OrderNumberCounter.objects.select_for_update().get_or_create(day=day)
+        OrderNumberCounter.objects.filter(pk=counter.pk).update(next_value=F('next_value') + size)
+        return counter.next_value, counter.next_value + size
+
+
+class OrderNumberAllocator:
+    """Distribue les numéros d'un bloc réservé, propre au processus"""
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._day = None
+        self._next = self._hi = 0
+
+    def _size(self):
+        return self.block_size or getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+
+    def next_value(self):
+        """Retourne (jour, numéro) ; ne touche la base qu'en début de bloc"""
+        day = timezone.localdate()
+        with self._lock:
+            # Après un fork, le bloc hérité appartient au processus parent
+            if self._pid != os.getpid():
+                self._reset()
+            if self._day != day or self._next >= self._hi:
+                self._next, self._hi = reserve_block(day, self._size())
+                self._day = day
+            value = self._next
+            self._next += 1
+        return day, value
+
+    def next_number(self):
+        day, value = self.next_value()
+        return f"{day:%Y%m%d}-{value:06d}"
+
+
+order_number_allocator = OrderNumberAllocator()
+
+
+def next_order_number():
+    """Numéro de commande unique suivant"""
+    return order_number_allocator.next_number()
@@ -0,0 +1,135 @@
+"""
+Machine à états des commandes et changements de statut en masse
+
+Transitions autorisées :
+
+    pending ──> processing ──> shipped ──> delivered
+       │             │
+       └─────────────┴──> cancelled
+
+transition_orders() traite les commandes par lots bornés
+(ORDER_TRANSITION_BATCH_SIZE), une transaction courte par lot : les lignes
+d'un lot sont verrouillées puis passées au nouveau statut par un UPDATE
+dont le WHERE ne retient que les statuts de départ autorisés. Dans la même
+transaction : historique (OrderStatusHistory, bulk_create), événements de
+l'outbox, statistiques clients et, pour une annulation, remise en stock
+des articles (core.inventory). Après le commit de chaque lot : cumuls de
+ventes (core.sales) et signal `order_status_changed`.
+
+Marquer 50 000 commandes comme expédiées ne verrouille donc jamais plus
+d'un lot à la fois, et un lot validé le reste si un lot suivant échoue.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .customer_stats import record_status_changes
+from .inventory import restock_orders
+from .models import Order, OrderStatusHistory
+from .outbox import record_status_events
+from .sales import record_sales_status_changes
+
+DEFAULT_BATCH_SIZE = 500
+
+TRANSITIONS = {
+    'pending': ('processing', 'cancelled'),
+    'processing': ('shipped', 'cancelled'),
+    'shipped': ('delivered',),
+    'delivered': (),
+    'cancelled': (),
+}
+
+# Envoyé après le commit de chaque lot : order_ids, previous ({id: ancien statut}), status
+order_status_changed = Signal()
+
+
+def allowed_sources(status):
+    """Statuts depuis lesquels une commande peut passer à `status`"""
+    if status not in TRANSITIONS:
+        raise ValueError(f"Statut de commande inconnu : {status}")
+    return [source for source, targets in TRANSITIONS.items() if status in targets]
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+class TransitionReport:
+    """Résultat de transition_orders() : commandes modifiées par lot et refusées"""
+
+    def __init__(self, status):
+        self.status = status
+        self.batches = []
+        self.skipped = 0
+
+    @property
+    def updated(self):
+        return sum(self.batches)
+
+
+def record_history(rows, status, changed_by=None, source=''):
+    """Lignes d'historique d'un lot (`rows` lus avant la mise à jour)"""
+    changed_by_id = changed_by.pk if changed_by is not None else None
+    return OrderStatusHistory.objects.bulk_create([
+        OrderStatusHistory(
+            order_id=row['id'], from_status=row['status'], to_status=status,
+            changed_by_id=changed_by_id, source=source,
+        )
+        for row in rows
+    ])
+
+
+def _transition_batch(candidates, status, sources, after_id, batch_size, changed_by, source):
+    """Un lot dans sa transaction ; retourne les lignes modifiées"""
+    with transaction.atomic():
+        rows = list(
+            candidates.filter(id__gt=after_id)
+            .select_for_update(of=('self',))
+            .order_by('id')
+            .values('id', 'order_number', 'user_id', 'status', 'total_amount', 'payment_method')[:batch_size]
+        )
+        if not rows:
+            return rows
+        Order.objects.filter(id__in=[row['id'] for row in rows], status__in=sources).update(
+            status=status, updated_at=timezone.now(),
+        )
+        record_history(rows, status, changed_by, source)
+        record_status_events(rows, status)
+        record_status_changes([(row['user_id'], row['status'], row['total_amount']) for row in rows], status)
+        record_sales_status_changes([(row['id'], row['status']) for row in rows], status)
+        if status == 'cancelled':
+            restock_orders([row['id'] for row in rows])
+
+        previous = {row['id']: row['status'] for row in rows}
+        transaction.on_commit(lambda: order_status_changed.send(
+            sender=Order, order_ids=list(previous), previous=previous, status=status,
+        ))
+    return rows
+
+
+def transition_orders(queryset, status, batch_size=None, changed_by=None, source='', on_batch=None):
+    """
+    Passe les commandes de `queryset` au statut `status`, par lots
+
+    Les commandes dont le statut actuel n'autorise pas la transition sont
+    laissées telles quelles et comptées dans `skipped`. `on_batch(numéro,
+    nombre)` est appelé après chaque lot validé. Retourne un TransitionReport.
+    """
+    batch_size = batch_size or getattr(settings, 'ORDER_TRANSITION_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    sources = allowed_sources(status)
+    report = TransitionReport(status)
+    report.skipped = queryset.exclude(status__in=sources).exclude(status=status).count()
+
+    candidates = queryset.filter(status__in=sources)
+    after_id = 0
+    while True:
+        rows = _transition_batch(candidates, status, sources, after_id, batch_size, changed_by, source)
+        if not rows:
+            break
+        after_id = rows[-1]['id']
+        report.batches.append(len(rows))
+        if on_batch is not None:
+            on_batch(len(report.batches), len(rows))
+    return report
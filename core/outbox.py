@@ -0,0 +1,270 @@
+"""
+Outbox transactionnelle des événements de commande
+
+Chaque création ou changement de statut de commande écrit un OutboxEvent
+dans la même transaction que la commande : l'événement existe si et
+seulement si la modification a été validée. La commande `relay_outbox`
+lit ensuite les événements non livrés par lots, dans l'ordre des ids, et
+les transmet à un « sink » (HTTP, fichier...).
+
+Livraison au moins une fois, dans l'ordre strict des ids : un lot est
+réservé puis envoyé hors transaction, et n'est marqué livré qu'après
+acquittement du sink ; les destinataires doivent dédoublonner sur `id`. Si le sink échoue, le lot est replanifié avec un
+délai croissant et rien de plus récent n'est livré avant lui
+(contre-pression) : les commandes continuent d'être passées, seuls les
+événements s'accumulent dans la table.
+"""
+
+import json
+import logging
+import urllib.error
+import urllib.request
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+ORDER_CREATED = 'order.created'
+ORDER_STATUS_CHANGED = 'order.status_changed'
+
+DEFAULT_BATCH_SIZE = 100
+
+# Durée de réservation d'un lot pendant son envoi (secondes)
+DEFAULT_CLAIM_TIMEOUT = 300
+
+
+# ==================== ÉCRITURE ====================
+
+def order_payload(order):
+    return {
+        'order_id': order.id,
+        'order_number': order.order_number,
+        'user_id': order.user_id,
+        'status': order.status,
+        'total_amount': str(order.total_amount),
+        'payment_method': order.payment_method,
+    }
+
+
+def record_order_created(order):
+    """Événement de création (à appeler dans la transaction de la commande)"""
+    items = list(order.items.values('product_id', 'quantity', 'price').order_by('id'))
+    payload = order_payload(order)
+    payload['items'] = [
+        {**item, 'price': str(item['price'])} for item in items
+    ]
+    return OutboxEvent.objects.create(event_type=ORDER_CREATED, order=order, payload=payload)
+
+
+def record_status_change(order, previous_status):
+    """Événement de changement de statut d'une commande"""
+    if order.status == previous_status:
+        return None
+    return OutboxEvent.objects.create(
+        event_type=ORDER_STATUS_CHANGED,
+        order=order,
+        payload={**order_payload(order), 'previous_status': previous_status},
+    )
+
+
+def record_status_events(rows, status):
+    """
+    Événements d'un lot de changements de statut, en un bulk_create
+
+    `rows` : dicts (id, order_number, user_id, status, total_amount,
+    payment_method) lus avant la mise à jour ; `status` est le nouveau statut.
+    """
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(
+            event_type=ORDER_STATUS_CHANGED,
+            order_id=row['id'],
+            payload={
+                'order_id': row['id'],
+                'order_number': row['order_number'],
+                'user_id': row['user_id'],
+                'status': status,
+                'previous_status': row['status'],
+                'total_amount': str(row['total_amount']),
+                'payment_method': row['payment_method'],
+            },
+        )
+        for row in rows
+    ])
+
+
+# ==================== SINKS ====================
+
+class SinkError(Exception):
+    """Le destinataire n'a pas acquitté le lot"""
+
+
+class Sink:
+    """Destinataire d'événements : send() doit lever SinkError en cas d'échec"""
+
+    def send(self, events):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileSink(Sink):
+    """Ajoute les événements à un fichier JSON Lines (tests, rejeu)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def send(self, events):
+        try:
+            with self.path.open('a', encoding='utf-8') as handle:
+                for event in events:
+                    handle.write(json.dumps(event, cls=DjangoJSONEncoder) + '\n')
+        except OSError as exc:
+            raise SinkError(str(exc)) from exc
+
+
+class HttpSink(Sink):
+    """POST du lot en JSON ({"events": [...]}) ; toute réponse 2xx vaut acquittement"""
+
+    def __init__(self, url, timeout=10, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+
+    def send(self, events):
+        body = json.dumps({'events': events}, cls=DjangoJSONEncoder).encode()
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                if not 200 <= response.status < 300:
+                    raise SinkError(f'HTTP {response.status}')
+        except (urllib.error.URLError, OSError) as exc:
+            raise SinkError(str(exc)) from exc
+
+
+class LogSink(Sink):
+    """Écrit les événements dans les logs (développement)"""
+
+    def send(self, events):
+        for event in events:
+            logger.info("Événement %s #%s : %s", event['type'], event['id'], event['payload'])
+
+
+def sink_from_url(url):
+    """file:/chemin, http(s)://... ou log:"""
+    if url.startswith('file:'):
+        return FileSink(url[len('file:'):])
+    if url.startswith(('http://', 'https://')):
+        return HttpSink(url)
+    if url == 'log:':
+        return LogSink()
+    raise ValueError(f"Sink inconnu : {url}")
+
+
+def get_sink():
+    """Sink configuré par OUTBOX_SINK (chemin pointé) et OUTBOX_SINK_OPTIONS"""
+    path = getattr(settings, 'OUTBOX_SINK', 'core.outbox.LogSink')
+    return import_string(path)(**getattr(settings, 'OUTBOX_SINK_OPTIONS', {}))
+
+
+# ==================== RELAIS ====================
+
+def retry_delay(attempts):
+    base = getattr(settings, 'OUTBOX_RETRY_BASE_DELAY', 5)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), 600))
+
+
+def serialize_event(event):
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'created_at': event.created_at,
+        'payload': event.payload,
+    }
+
+
+def pending_events():
+    """Événements non encore livrés"""
+    return OutboxEvent.objects.filter(delivered_at__isnull=True)
+
+
+def claim_batch(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Réserve le lot d'événements en attente le plus ancien ; [] si rien à livrer
+
+    Transaction courte : l'événement de tête est verrouillé (SKIP LOCKED
+    sous PostgreSQL), puis le lot reçoit une échéance next_attempt_at à
+    OUTBOX_CLAIM_TIMEOUT secondes qui sert de bail. Tant qu'il court, les
+    autres relais trouvent la tête « replanifiée » et ne livrent rien ; si
+    le relais meurt pendant l'envoi, le lot redevient livrable à échéance.
+    """
+    with transaction.atomic():
+        head_id = pending_events().order_by('id').values_list('id', flat=True).first()
+        if head_id is None:
+            return []
+        head = OutboxEvent.objects.filter(id=head_id, delivered_at__isnull=True)
+        if connection.features.has_select_for_update_skip_locked:
+            head = head.select_for_update(skip_locked=True)
+        head = head.first()
+        if head is None:
+            return []  # Lot en cours de réservation par un autre relais
+        now = timezone.now()
+        if head.next_attempt_at is not None and head.next_attempt_at > now:
+            return []  # Lot en cours d'envoi, ou replanifié après un échec
+
+        events = list(
+            pending_events().filter(id__gte=head.id).select_for_update().order_by('id')[:batch_size]
+        )
+        lease = timedelta(seconds=getattr(settings, 'OUTBOX_CLAIM_TIMEOUT', DEFAULT_CLAIM_TIMEOUT))
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(next_attempt_at=now + lease)
+    return events
+
+
+def relay_batch(sink, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Transmet le lot d'événements en attente le plus ancien
+
+    Le lot commence toujours au plus ancien événement non livré : tant
+    qu'il n'est pas acquitté (par exemple pendant son délai de nouvelle
+    tentative), aucun événement plus récent n'est livré. Le lot est
+    réservé (claim_batch) puis envoyé hors transaction : un sink lent ne
+    garde ni transaction ni verrou ouverts. Le résultat est enregistré dans
+    une seconde transaction courte. Retourne le nombre d'événements livrés
+    (0 s'il n'y a rien à livrer pour l'instant) ; lève SinkError si le lot
+    a été refusé (il est alors replanifié).
+    """
+    events = claim_batch(batch_size)
+    if not events:
+        return 0
+
+    ids = [event.id for event in events]
+    try:
+        sink.send([serialize_event(event) for event in events])
+    except SinkError as exc:
+        attempts = max(event.attempts for event in events) + 1
+        OutboxEvent.objects.filter(id__in=ids).update(
+            attempts=F('attempts') + 1,
+            next_attempt_at=timezone.now() + retry_delay(attempts),
+            last_error=str(exc)[:1000],
+        )
+        raise
+    OutboxEvent.objects.filter(id__in=ids).update(
+        delivered_at=timezone.now(), next_attempt_at=None, last_error='',
+    )
+    return len(events)
+
+
+def purge_delivered(older_than_days=7):
+    """Supprime les événements livrés depuis plus de `older_than_days` jours"""
+    limit = timezone.now() - timedelta(days=older_than_days)
+    deleted, _details = OutboxEvent.objects.filter(delivered_at__lt=limit).delete()
+    return deleted
@@ -0,0 +1,255 @@
+"""
+Pagination par curseur (keyset) pour les listes de produits
+
+Au lieu d'un OFFSET qui grossit avec le numéro de page, chaque page est lue
+en « cherchant » après le tuple (clé de tri, id) de la dernière ligne vue :
+la page N coûte autant que la page 1. Le nombre total de résultats est mis
+en cache pour ne pas relancer un COUNT(*) à chaque affichage.
+"""
+
+import base64
+import datetime
+import hashlib
+import json
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+# Ordres supportés : toujours terminés par l'id pour garantir un ordre total
+KEYSET_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'price_asc': ('final_price', 'id'),
+    'price_desc': ('-final_price', '-id'),
+    'name': ('name', 'id'),
+}
+
+
+class InvalidCursor(Exception):
+    """Curseur de pagination illisible ou falsifié"""
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """Conserve les microsecondes (DjangoJSONEncoder les tronque à la milliseconde)"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, backwards=False, key=''):
+    """Encode les valeurs de tri d'une ligne (et le tri `key`) dans un jeton URL-safe"""
+    payload = json.dumps({'v': values, 'b': backwards, 'k': key}, cls=CursorJSONEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Décode un jeton produit par encode_cursor()"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return list(payload['v']), bool(payload['b']), str(payload.get('k', ''))
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(token)
+
+
+class KeysetPage(Sequence):
+    """
+    Page de résultats compatible avec l'interface de django.core.paginator.Page
+    utilisée par les templates (has_next, next_page_number, paginator...)
+    """
+
+    def __init__(self, object_list, number, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<KeysetPage {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return max(self.number - 1, 1)
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
+
+
+class KeysetPaginator:
+    """
+    Paginateur par curseur sur un tuple de colonnes de tri
+
+    `ordering` est une suite de noms de champs au format order_by()
+    (ex. ('-created_at', '-id')) dont le dernier doit être unique. Le tri
+    est inscrit dans chaque curseur : un curseur produit pour un autre tri
+    est refusé au lieu d'être relu avec de mauvaises colonnes.
+
+    `count_queryset` (par défaut `queryset`) sert au comptage et à sa clé
+    de cache : passer le queryset avant les annotations dont le SQL change
+    à chaque requête (ex. with_available_stock, qui contient l'heure).
+    """
+
+    def __init__(self, queryset, per_page, ordering, count_timeout=None, count_queryset=None):
+        self.ordering = tuple(ordering)
+        self.key = ','.join(self.ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+        self.count_queryset = (count_queryset if count_queryset is not None else queryset).order_by()
+        self.per_page = int(per_page)
+        self.count_timeout = (
+            count_timeout if count_timeout is not None
+            else getattr(settings, 'KEYSET_COUNT_CACHE_TIMEOUT', 300)
+        )
+        self._fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        ]
+
+    @cached_property
+    def count(self):
+        """Nombre total (approximatif) de résultats, mis en cache par requête SQL"""
+        try:
+            sql = str(self.count_queryset.query)
+        except Exception:
+            return self.count_queryset.count()
+        key = 'keyset_count:' + hashlib.md5(sql.encode()).hexdigest()
+        return cache.get_or_set(key, self.count_queryset.count, self.count_timeout)
+
+    @cached_property
+    def num_pages(self):
+        if not self.count:
+            return 1
+        return -(-self.count // self.per_page)
+
+    @property
+    def page_range(self):
+        return range(1, self.num_pages + 1)
+
+    def get_page(self, number=None, cursor=None):
+        """
+        Retourne la page demandée
+
+        Un numéro de page invalide ramène à la première page ; un curseur
+        illisible ou produit pour un autre tri lève Http404.
+        """
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+
+        if cursor:
+            try:
+                values, backwards, key = decode_cursor(cursor)
+                if key != self.key:
+                    raise InvalidCursor(cursor)
+                return self._seek_page(self._to_python(values), backwards, number)
+            except InvalidCursor:
+                raise Http404("Curseur de pagination invalide pour ce tri.")
+
+        number = min(number, self.num_pages)
+        return self._offset_page(number)
+
+    def _to_python(self, values):
+        if len(values) != len(self._fields):
+            raise InvalidCursor(values)
+        meta = self.queryset.model._meta
+        try:
+            converted = []
+            for (name, _desc), value in zip(self._fields, values):
+                field = meta.get_field(name)
+                # Les GeneratedField délèguent la conversion à leur output_field
+                field = getattr(field, 'output_field', field)
+                converted.append(field.to_python(value))
+            return converted
+        except Exception:
+            raise InvalidCursor(values)
+
+    def _seek_filter(self, values, backwards):
+        """Construit (a > v1) OR (a = v1 AND b > v2) ... selon le sens de tri"""
+        condition = Q()
+        for i, (name, descending) in enumerate(self._fields):
+            after = descending == backwards
+            clause = Q(**{f'{name}__{"gt" if after else "lt"}': values[i]})
+            for j, (prev_name, _desc) in enumerate(self._fields[:i]):
+                clause &= Q(**{prev_name: values[j]})
+            condition |= clause
+        return condition
+
+    def _row_values(self, obj):
+        return [getattr(obj, name) for name, _desc in self._fields]
+
+    def _seek_page(self, values, backwards, number):
+        queryset = self.queryset.filter(self._seek_filter(values, backwards))
+        if backwards:
+            queryset = queryset.reverse()
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, True
+        return self._build_page(rows, number, has_next, has_previous and number > 1)
+
+    def _offset_page(self, number):
+        bottom = (number - 1) * self.per_page
+        rows = list(self.queryset[bottom:bottom + self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return self._build_page(rows[:self.per_page], number, has_next, number > 1)
+
+    def _build_page(self, rows, number, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(self._row_values(rows[-1]), key=self.key)
+        if rows and has_previous:
+            previous_cursor = encode_cursor(self._row_values(rows[0]), backwards=True, key=self.key)
+        return KeysetPage(rows, number, self, next_cursor, previous_cursor)
+
+
+def paginate_products(request, products, sort, per_page=12, annotate=None):
+    """
+    Pagine un queryset de produits pour les vues de liste et de recherche
+
+    Utilise la pagination par curseur si CATALOG_KEYSET_PAGINATION est activé
+    et que le tri demandé est supporté, sinon le Paginator classique.
+    `annotate(queryset)` (ex. with_available_stock) s'applique aux lignes
+    affichées mais pas au comptage mis en cache. Retourne (paginator, page).
+    """
+    rows = annotate(products) if annotate is not None else products
+    ordering = KEYSET_ORDERINGS.get(sort)
+    if getattr(settings, 'CATALOG_KEYSET_PAGINATION', False) and ordering:
+        paginator = KeysetPaginator(rows, per_page, ordering, count_queryset=products)
+        return paginator, paginator.get_page(request.GET.get('page'), request.GET.get('cursor'))
+
+    paginator = Paginator(rows, per_page)
+    return paginator, paginator.get_page(request.GET.get('page'))
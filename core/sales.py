@@ -0,0 +1,234 @@
+"""
+Cumuls de ventes journaliers (totaux, par produit, par catégorie)
+
+Le tableau de bord des ventes ne lit que ces tables : aucune agrégation
+sur core_orderitem au moment de l'affichage.
+
+- commande passée : ses lignes sont agrégées par (jour, produit) et
+  (jour, catégorie) puis ajoutées aux cumuls par un upsert incrémental
+  (INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x) ;
+- commande annulée (ou réactivée) : même delta, de signe opposé.
+
+Les deltas sont appliqués après le commit de la commande, dans leur propre
+transaction très courte : la ligne du jour, partagée par toutes les
+commandes, n'est jamais verrouillée pendant un passage de commande. Si
+l'application d'un delta échoue, la commande `backfill_sales_rollups`
+recalcule les jours concernés depuis les commandes.
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyCategorySales, DailyProductSales, DailySales, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+CANCELLED = 'cancelled'
+
+BACKFILL_CHUNK_DAYS = 31
+
+# (modèle, clé de regroupement sur OrderItem, colonne de la clé)
+ROLLUPS = (
+    (DailySales, None, None),
+    (DailyProductSales, 'product_id', 'product_id'),
+    (DailyCategorySales, 'product__category_id', 'category_id'),
+)
+
+
+# ==================== AGRÉGATION ====================
+
+def _line_revenue():
+    return ExpressionWrapper(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _aggregate(items, key):
+    """Lignes (jour, [clé,] order_count, units, revenue) de `items`"""
+    fields = {'day': TruncDate('order__created_at')}
+    if key:
+        fields['key'] = F(key)
+    return items.values(**fields).annotate(
+        order_count=Count('order_id', distinct=True),
+        units=Sum('quantity'),
+        revenue=Sum(_line_revenue()),
+    ).order_by()
+
+
+# ==================== MISE À JOUR INCRÉMENTALE ====================
+
+def _upsert_deltas(model, column, rows, sign):
+    table = model._meta.db_table
+    now = timezone.now()
+    key_columns = ['day'] + ([column] if column else [])
+    values = [
+        (row['day'], *([row['key']] if column else []),
+         sign * row['order_count'], sign * row['units'], sign * row['revenue'], now)
+        for row in sorted(rows, key=lambda row: (row['day'], row.get('key') or 0))
+    ]
+    if not values:
+        return
+
+    if connection.vendor in ('postgresql', 'sqlite'):
+        columns = ', '.join(key_columns + ['order_count', 'units', 'revenue', 'updated_at'])
+        placeholders = ', '.join(['%s'] * (len(key_columns) + 4))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {table} ({columns}) VALUES ({placeholders}) '
+                f'ON CONFLICT ({", ".join(key_columns)}) DO UPDATE SET '
+                f'order_count = {table}.order_count + excluded.order_count, '
+                f'units = {table}.units + excluded.units, '
+                f'revenue = {table}.revenue + excluded.revenue, '
+                f'updated_at = excluded.updated_at',
+                values,
+            )
+        return
+
+    # Autres bases : UPDATE relatif, INSERT si la ligne n'existe pas encore
+    for *keys, order_count, units, revenue, _now in values:
+        lookup = dict(zip(key_columns, keys))
+        updated = model.objects.filter(**lookup).update(
+            order_count=F('order_count') + order_count,
+            units=F('units') + units,
+            revenue=F('revenue') + revenue,
+        )
+        if not updated:
+            model.objects.create(**lookup, order_count=order_count, units=units, revenue=revenue)
+
+
+def apply_order_sales(order_ids, sign=1):
+    """Ajoute (sign=1) ou retire (sign=-1) les ventes des commandes `order_ids`"""
+    items = OrderItem.objects.filter(order_id__in=order_ids)
+    with transaction.atomic():
+        for model, key, column in ROLLUPS:
+            _upsert_deltas(model, column, list(_aggregate(items, key)), sign)
+
+
+def _apply_on_commit(order_ids, sign):
+    def apply():
+        try:
+            apply_order_sales(order_ids, sign)
+        except DatabaseError:
+            logger.exception(
+                "Cumuls de ventes non mis à jour pour %s commande(s) ; "
+                "relancer backfill_sales_rollups", len(order_ids),
+            )
+
+    transaction.on_commit(apply)
+
+
+def record_order_sales(order):
+    """Compte les ventes d'une nouvelle commande (après le commit de sa transaction)"""
+    if order.status != CANCELLED:
+        _apply_on_commit([order.pk], 1)
+
+
+def record_sales_status_changes(changes, new_status):
+    """
+    Ajuste les cumuls après des changements de statut
+
+    `changes` : itérable de (order_id, ancien statut). Seuls les passages
+    vers ou depuis « annulée » modifient les ventes.
+    """
+    removed, restored = [], []
+    for order_id, previous_status in changes:
+        if previous_status == new_status:
+            continue
+        if new_status == CANCELLED:
+            removed.append(order_id)
+        elif previous_status == CANCELLED:
+            restored.append(order_id)
+    if removed:
+        _apply_on_commit(removed, -1)
+    if restored:
+        _apply_on_commit(restored, 1)
+
+
+# ==================== RECALCUL ====================
+
+def _day_start(day):
+    """Minuit (heure locale) du jour `day`, en datetime aware"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_sales_rollups(date_from=None, date_to=None, chunk_days=BACKFILL_CHUNK_DAYS):
+    """
+    Recalcule les cumuls des jours [date_from, date_to] depuis les commandes
+
+    Par tranches de `chunk_days` jours, une transaction par tranche : les
+    cumuls de la tranche sont supprimés puis réinsérés en bulk_create.
+    Par défaut, de la première commande à aujourd'hui. Retourne le nombre
+    de jours ayant des ventes.
+    """
+    if date_from is None:
+        first = Order.objects.aggregate(first=Min('created_at'))['first']
+        if first is None:
+            return 0
+        date_from = timezone.localdate(first)
+    date_to = date_to or timezone.localdate()
+
+    days = 0
+    start = date_from
+    while start <= date_to:
+        end = min(start + timedelta(days=chunk_days - 1), date_to)
+        # Bornes datetime semi-ouvertes : l'index sur created_at reste utilisable
+        items = OrderItem.objects.filter(
+            order__created_at__gte=_day_start(start),
+            order__created_at__lt=_day_start(end + timedelta(days=1)),
+        ).exclude(order__status=CANCELLED)
+        with transaction.atomic():
+            for model, key, column in ROLLUPS:
+                model.objects.filter(day__gte=start, day__lte=end).delete()
+                rows = list(_aggregate(items, key))
+                model.objects.bulk_create([
+                    model(
+                        day=row['day'], order_count=row['order_count'], units=row['units'],
+                        revenue=row['revenue'], **({column: row['key']} if column else {}),
+                    )
+                    for row in rows
+                ], batch_size=1000)
+                if model is DailySales:
+                    days += len(rows)
+        start = end + timedelta(days=1)
+    return days
+
+
+# ==================== LECTURE (TABLEAU DE BORD) ====================
+
+def sales_series(date_from, date_to):
+    """Ventes de chaque jour de la période, jours sans vente compris"""
+    rows = {
+        row['day']: row
+        for row in DailySales.objects.filter(day__gte=date_from, day__lte=date_to)
+        .values('day', 'order_count', 'units', 'revenue')
+    }
+    series = []
+    day = date_from
+    while day <= date_to:
+        series.append(rows.get(day, {
+            'day': day, 'order_count': 0, 'units': 0, 'revenue': Decimal('0'),
+        }))
+        day += timedelta(days=1)
+    return series
+
+
+def top_products(date_from, date_to, limit=10):
+    return list(
+        DailyProductSales.objects.filter(day__gte=date_from, day__lte=date_to)
+        .values('product_id', 'product__name')
+        .annotate(revenue=Sum('revenue'), units=Sum('units'), order_count=Sum('order_count'))
+        .order_by('-revenue', 'product_id')[:limit]
+    )
+
+
+def top_categories(date_from, date_to, limit=10):
+    return list(
+        DailyCategorySales.objects.filter(day__gte=date_from, day__lte=date_to)
+        .values('category_id', 'category__name')
+        .annotate(revenue=Sum('revenue'), units=Sum('units'), order_count=Sum('order_count'))
+        .order_by('-revenue', 'category_id')[:limit]
+    )
@@ -0,0 +1,203 @@
+"""
+Moteurs de recherche plein texte pour le catalogue
+
+- PostgreSQL : colonne tsvector pondérée sur core_product + index GIN
+- SQLite : table virtuelle FTS5 core_product_fts (rowid = id du produit)
+- Autres bases : repli sur des filtres icontains
+
+Les index sont créés par la migration 0003 et tenus à jour par les signaux
+de core.signals ; la commande `rebuild_search_index` les reconstruit après
+un import en masse (bulk_create/update ne déclenchent pas de signaux).
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Nombre maximum de termes pris en compte dans une recherche
+MAX_TERMS = 8
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """Découpe la saisie utilisateur en termes sûrs pour les syntaxes FTS"""
+    return WORD_RE.findall(query.lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """Repli générique : filtres icontains et score grossier par champ"""
+
+    def search(self, queryset, query):
+        """Filtre `queryset` sur `query` et l'annote avec `search_rank`"""
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(name__icontains=term) |
+                Q(brand__icontains=term) |
+                Q(description__icontains=term) |
+                Q(category__name__icontains=term)
+            )
+        return queryset.filter(condition).annotate(search_rank=Case(
+            When(name__icontains=terms[0], then=Value(3.0)),
+            When(brand__icontains=terms[0], then=Value(2.0)),
+            default=Value(1.0),
+            output_field=FloatField(),
+        ))
+
+    def index_products(self, product_ids=None):
+        """(Ré)indexe les produits donnés, ou tout le catalogue"""
+
+    def index_category(self, category_id):
+        """Réindexe les produits d'une catégorie (nom de catégorie modifié)"""
+
+    def remove_products(self, product_ids):
+        """Retire des produits de l'index"""
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Recherche via la colonne core_product.search_vector (tsvector + GIN)"""
+
+    config = 'french'
+
+    VECTOR_SQL = (
+        "setweight(to_tsvector(%(config)s, coalesce(p.name, '')), 'A') || "
+        "setweight(to_tsvector(%(config)s, coalesce(p.brand, '')), 'B') || "
+        "setweight(to_tsvector(%(config)s, coalesce(c.name, '')), 'C') || "
+        "setweight(to_tsvector(%(config)s, coalesce(p.description, '')), 'D')"
+    )
+
+    def _tsquery(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+
+        table = queryset.model._meta.db_table
+        params = [self.config, self._tsquery(terms)]
+        return queryset.filter(RawSQL(
+            f'"{table}"."search_vector" @@ to_tsquery(%s, %s)',
+            params, output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank("{table}"."search_vector", to_tsquery(%s, %s))',
+            params, output_field=FloatField(),
+        ))
+
+    def _reindex(self, where, params):
+        vector = self.VECTOR_SQL % {'config': "'%s'" % self.config}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE core_product p SET search_vector = {vector} "
+                f"FROM core_category c WHERE c.id = p.category_id {where}",
+                params,
+            )
+
+    def index_products(self, product_ids=None):
+        if product_ids is None:
+            self._reindex('', [])
+        elif product_ids:
+            self._reindex('AND p.id = ANY(%s)', [list(product_ids)])
+
+    def index_category(self, category_id):
+        self._reindex('AND p.category_id = %s', [category_id])
+
+
+class SQLiteFTSSearchBackend(SearchBackend):
+    """Recherche via la table virtuelle FTS5 core_product_fts"""
+
+    # Poids bm25 des colonnes (name, brand, description, category)
+    WEIGHTS = (10.0, 5.0, 1.0, 2.0)
+
+    def _match(self, terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+
+        table = queryset.model._meta.db_table
+        match = self._match(terms)
+        weights = ', '.join(str(weight) for weight in self.WEIGHTS)
+        return queryset.filter(id__in=RawSQL(
+            'SELECT rowid FROM core_product_fts WHERE core_product_fts MATCH %s',
+            [match],
+        )).annotate(search_rank=RawSQL(
+            # bm25() est négatif : plus il est bas, plus le résultat est pertinent
+            f'SELECT -bm25(core_product_fts, {weights}) FROM core_product_fts '
+            f'WHERE core_product_fts MATCH %s AND rowid = "{table}"."id"',
+            [match], output_field=FloatField(),
+        ))
+
+    def _reindex(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM core_product_fts WHERE rowid IN '
+                f'(SELECT p.id FROM core_product p WHERE 1 = 1 {where})',
+                params,
+            )
+            cursor.execute(
+                'INSERT INTO core_product_fts (rowid, name, brand, description, category) '
+                'SELECT p.id, p.name, p.brand, p.description, c.name '
+                'FROM core_product p JOIN core_category c ON c.id = p.category_id '
+                f'WHERE 1 = 1 {where}',
+                params,
+            )
+
+    def index_products(self, product_ids=None):
+        if product_ids is None:
+            with connection.cursor() as cursor:
+                cursor.execute('DELETE FROM core_product_fts')
+            self._reindex('', [])
+        elif product_ids:
+            placeholders = ', '.join(['%s'] * len(product_ids))
+            self._reindex(f'AND p.id IN ({placeholders})', list(product_ids))
+
+    def index_category(self, category_id):
+        self._reindex('AND p.category_id = %s', [category_id])
+
+    def remove_products(self, product_ids):
+        if not product_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM core_product_fts WHERE rowid IN ({placeholders})',
+                list(product_ids),
+            )
+
+
+BACKENDS_BY_VENDOR = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteFTSSearchBackend,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Retourne le moteur de recherche configuré
+
+    SEARCH_BACKEND (chemin pointé) force un moteur ; sinon il est choisi
+    d'après la base de données par défaut.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', None)
+        if path:
+            backend_class = import_string(path)
+        else:
+            backend_class = BACKENDS_BY_VENDOR.get(connection.vendor, SearchBackend)
+        _backend = backend_class()
+    return _backend
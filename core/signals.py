@@ -0,0 +1,69 @@
+"""
+Signaux de l'application e-commerce
+"""
+
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import bump_catalog_version
+from .cart import forget_cart_count, merge_cookie_cart
+from .categories import invalidate_categories
+from .models import Category, Product
+from .search import get_search_backend
+
+
+# ==================== INDEX DE RECHERCHE ====================
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """Met à jour l'entrée du produit dans l'index plein texte"""
+    if raw:  # loaddata : l'index sera reconstruit par rebuild_search_index
+        return
+    get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Retire le produit supprimé de l'index plein texte"""
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category_products(sender, instance, created=False, raw=False, **kwargs):
+    """Le nom de la catégorie fait partie du document indexé de ses produits"""
+    if raw or created:
+        return
+    get_search_backend().index_category(instance.pk)
+
+
+# ==================== CACHE DU CATALOGUE ====================
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Toute modification du catalogue invalide les facettes et pages en cache"""
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_registry(sender, **kwargs):
+    """Les registres de catégories de tous les workers se rechargeront"""
+    invalidate_categories()
+
+
+# ==================== PANIER ====================
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """
+    Fusionne le panier anonyme (cookie) dans le panier de l'utilisateur ;
+    le badge sera recalculé pour ce panier
+    """
+    if request is None or not hasattr(request, 'session'):
+        return
+    merge_cookie_cart(request, user)
+    forget_cart_count(request)
@@ -0,0 +1,105 @@
+"""
+Tâches d'arrière-plan (exécutées par `manage.py run_jobs`)
+
+Chaque tâche reçoit des identifiants plutôt que des objets et relit ce
+dont elle a besoin : elle peut être rejouée sans effet de bord double
+côté base.
+"""
+
+from django.conf import settings
+from django.contrib.auth.forms import PasswordResetForm
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import mail_admins, send_mail
+from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .dashboard import refresh_admin_stats as refresh_admin_stats_snapshot
+from .inventory import with_available_stock
+from .jobs import task
+from .models import Order, Product, User
+
+
+@task('send_order_confirmation')
+def send_order_confirmation(order_id):
+    """Email de confirmation de commande"""
+    order = Order.objects.select_related('user').get(id=order_id)
+    if not order.user.email:
+        return
+    items = order.items.select_related('product').order_by('id')
+    body = render_to_string('order_confirmation_email.txt', {'order': order, 'items': items})
+    send_mail(
+        f"Confirmation de votre commande {order.order_number} - Nexus Shop",
+        body,
+        settings.DEFAULT_FROM_EMAIL,
+        [order.user.email],
+    )
+
+
+@task('notify_low_stock')
+def notify_low_stock(product_ids):
+    """
+    Alerte les administrateurs des produits passés sous le seuil de stock
+
+    Le seuil porte sur le stock disponible (réservations déduites), celui
+    que voient les clients.
+    """
+    threshold = getattr(settings, 'LOW_STOCK_THRESHOLD', 5)
+    products = list(
+        with_available_stock(Product.objects.filter(id__in=product_ids, is_available=True))
+        .filter(available_stock__lte=threshold)
+        .order_by('available_stock')
+        .values_list('name', 'available_stock')
+    )
+    if not products:
+        return
+    lines = '\n'.join(f"- {name} : {stock} en stock" for name, stock in products)
+    mail_admins(
+        f"Stock bas sur {len(products)} produit(s)",
+        f"Les produits suivants sont sous le seuil de {threshold} unités :\n\n{lines}\n",
+    )
+
+
+@task('send_welcome_email')
+def send_welcome_email(user_id):
+    """Email de bienvenue après l'inscription"""
+    user = User.objects.get(id=user_id)
+    if not user.email:
+        return
+    send_mail(
+        "Bienvenue sur Nexus Shop",
+        render_to_string('welcome_email.txt', {'user': user}),
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
+
+
+@task('send_password_reset_email')
+def send_password_reset_email(user_id, domain, site_name, protocol, subject_template_name,
+                              email_template_name, from_email=None, to_email=None,
+                              html_email_template_name=None):
+    """Email de réinitialisation du mot de passe (lien généré ici, voir QueuedPasswordResetForm)"""
+    user = User.objects.get(id=user_id)
+    context = {
+        'email': user.email,
+        'domain': domain,
+        'site_name': site_name,
+        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+        'user': user,
+        'token': default_token_generator.make_token(user),
+        'protocol': protocol,
+    }
+    PasswordResetForm().send_mail(
+        subject_template_name,
+        email_template_name,
+        context,
+        from_email,
+        to_email or user.email,
+        html_email_template_name=html_email_template_name,
+    )
+
+
+@task('refresh_admin_stats', max_attempts=1)
+def refresh_admin_stats():
+    """Recalcule l'instantané du tableau de bord d'administration"""
+    refresh_admin_stats_snapshot()
@@ -1,3 +1,415 @@
+"""
+Tests du comportement des commandes, du stock et du catalogue
+"""
+
+import csv
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .catalog_import import import_catalog
+from .checkout import EmptyCart, OutOfStock, place_order
+from .inventory import available_stock, reserve_cart, restock_orders, sweep_reservations
+from .models import (
+    Cart, CartItem, Category, Order, OrderItem, OrderStatusHistory, OutboxEvent, Product, StockReservation,
+)
+from .order_status import allowed_sources, order_status_changed, transition_orders
+
+User = get_user_model()
+
+
+class ShopTestCase(TestCase):
+    """Catalogue minimal et raccourcis communs"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Audio', slug='audio')
+        cls.user = User.objects.create_user('client', 'client@example.com', 'secret')
+        cls.other_user = User.objects.create_user('autre', 'autre@example.com', 'secret')
+
+    def make_product(self, stock, price='10.00', slug=None, **fields):
+        slug = slug or f'produit-{Product.objects.count() + 1}'
+        return Product.objects.create(
+            name=slug.capitalize(), slug=slug, description='Description', price=Decimal(price),
+            category=self.category, image='products/a.jpg', stock=stock, **fields,
+        )
+
+    def make_cart(self, user, quantities):
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=quantity)
+            for product, quantity in quantities.items()
+        ])
+        return cart
+
+    def new_order(self, user, key=None):
+        return Order(
+            user=user, payment_method='paypal', shipping_address='1 rue de Paris',
+            billing_address='1 rue de Paris', idempotency_key=key,
+        )
+
+    def checkout(self, user, quantities, key=None):
+        return place_order(self.make_cart(user, quantities), self.new_order(user, key))
+
+    def stock_of(self, product):
+        return Product.objects.get(pk=product.pk).stock
+
+
+# ==================== PASSAGE DE COMMANDE ====================
+
+class PlaceOrderTests(ShopTestCase):
+
+    def test_order_takes_stock_and_copies_prices(self):
+        casque = self.make_product(stock=5, price='20.00', discount_price=Decimal('15.00'))
+        enceinte = self.make_product(stock=3, price='30.00')
+
+        order = self.checkout(self.user, {casque: 2, enceinte: 1})
+
+        self.assertEqual(self.stock_of(casque), 3)
+        self.assertEqual(self.stock_of(enceinte), 2)
+        self.assertEqual(order.total_amount, Decimal('60.00'))
+        self.assertEqual(order.stock_status, 'taken')
+        self.assertEqual(
+            sorted(OrderItem.objects.filter(order=order).values_list('product_id', 'quantity', 'price')),
+            sorted([(casque.pk, 2, Decimal('15.00')), (enceinte.pk, 1, Decimal('30.00'))]),
+        )
+        self.assertFalse(CartItem.objects.filter(cart__user=self.user).exists())
+
+    def test_oversell_is_refused_without_side_effects(self):
+        casque = self.make_product(stock=5)
+        enceinte = self.make_product(stock=1)
+        cart = self.make_cart(self.user, {casque: 2, enceinte: 2})
+
+        with self.assertRaises(OutOfStock) as raised:
+            place_order(cart, self.new_order(self.user))
+
+        self.assertEqual(raised.exception.products, [enceinte.name])
+        self.assertEqual(self.stock_of(casque), 5)
+        self.assertEqual(self.stock_of(enceinte), 1)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 2)
+
+    def test_last_units_go_to_a_single_order(self):
+        casque = self.make_product(stock=3)
+
+        self.checkout(self.user, {casque: 2})
+        with self.assertRaises(OutOfStock):
+            self.checkout(self.other_user, {casque: 2})
+
+        self.assertEqual(self.stock_of(casque), 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_unavailable_product_is_refused(self):
+        casque = self.make_product(stock=5, is_available=False)
+
+        with self.assertRaises(OutOfStock):
+            self.checkout(self.user, {casque: 1})
+        self.assertEqual(self.stock_of(casque), 5)
+
+    def test_empty_cart_is_refused(self):
+        with self.assertRaises(EmptyCart):
+            self.checkout(self.user, {})
+        self.assertFalse(Order.objects.exists())
+
+
+# ==================== RÉSERVATIONS ET REMISE EN STOCK ====================
+
+class ReservationTests(ShopTestCase):
+
+    def test_reservation_hides_stock_from_other_carts(self):
+        casque = self.make_product(stock=3)
+        mine = self.make_cart(self.user, {casque: 2})
+        theirs = self.make_cart(self.other_user, {casque: 2})
+
+        self.assertTrue(reserve_cart(mine))
+        self.assertEqual(available_stock(casque), 1)
+        self.assertEqual(reserve_cart(theirs).shortages, [casque.name])
+        # Sans réservation, le paiement tient compte de celles des autres paniers
+        with self.assertRaises(OutOfStock):
+            place_order(theirs, self.new_order(self.other_user))
+        self.assertEqual(self.stock_of(casque), 3)
+
+    def test_checkout_consumes_reservations_and_takes_stock(self):
+        casque = self.make_product(stock=3)
+        cart = self.make_cart(self.user, {casque: 2})
+        reserve_cart(cart)
+
+        order = place_order(cart, self.new_order(self.user))
+
+        self.assertEqual(self.stock_of(casque), 1)
+        self.assertEqual(order.stock_status, 'taken')
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(available_stock(Product.objects.get(pk=casque.pk)), 1)
+
+    def test_reserved_checkout_still_refuses_unavailable_product(self):
+        casque = self.make_product(stock=3)
+        cart = self.make_cart(self.user, {casque: 1})
+        reserve_cart(cart)
+        Product.objects.filter(pk=casque.pk).update(is_available=False)
+
+        with self.assertRaises(OutOfStock):
+            place_order(cart, self.new_order(self.user))
+        self.assertEqual(self.stock_of(casque), 3)
+        self.assertTrue(StockReservation.objects.filter(cart=cart).exists())
+
+    def test_expired_reservations_are_swept(self):
+        casque = self.make_product(stock=3)
+        cart = self.make_cart(self.user, {casque: 2})
+        reserve_cart(cart)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(available_stock(casque), 3)
+        self.assertEqual(sweep_reservations(), 1)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.stock_of(casque), 3)
+
+    def test_cancel_and_reactivate_move_stock_once(self):
+        casque = self.make_product(stock=5)
+        order = self.checkout(self.user, {casque: 2})
+        self.assertEqual(self.stock_of(casque), 3)
+
+        transition_orders(Order.objects.filter(pk=order.pk), 'cancelled')
+        self.assertEqual(self.stock_of(casque), 5)
+        # Rejouer la remise en stock ne rend rien de plus
+        self.assertEqual(restock_orders([order.pk]), 0)
+        self.assertEqual(self.stock_of(casque), 5)
+
+        # Réactivation (admin) : le stock est repris, une seule fois
+        restock_orders([order.pk], withdraw=True)
+        restock_orders([order.pk], withdraw=True)
+        self.assertEqual(self.stock_of(casque), 3)
+        self.assertEqual(Order.objects.get(pk=order.pk).stock_status, 'taken')
+
+    def test_cancelling_untracked_order_leaves_stock(self):
+        casque = self.make_product(stock=5)
+        # Commande saisie hors paiement (admin, historique) : stock jamais déduit
+        order = self.new_order(self.user)
+        order.order_number = 'CMD-TEST-1'
+        order.total_amount = Decimal('10.00')
+        order.save()
+        OrderItem.objects.create(order=order, product=casque, quantity=2, price=Decimal('10.00'))
+
+        transition_orders(Order.objects.filter(pk=order.pk), 'cancelled')
+        self.assertEqual(self.stock_of(casque), 5)
+        restock_orders([order.pk], withdraw=True)
+        self.assertEqual(self.stock_of(casque), 5)
+
+
+# ==================== IDEMPOTENCE DU PAIEMENT ====================
+
+class IdempotentCheckoutTests(ShopTestCase):
+
+    def test_replay_with_same_key_returns_the_first_order(self):
+        casque = self.make_product(stock=5)
+
+        first = self.checkout(self.user, {casque: 2}, key='cle-commande-1')
+        replay = self.checkout(self.user, {casque: 2}, key='cle-commande-1')
+
+        self.assertFalse(first.replayed)
+        self.assertTrue(replay.replayed)
+        self.assertEqual(replay.pk, first.pk)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.stock_of(casque), 3)
+
+    def test_different_keys_place_different_orders(self):
+        casque = self.make_product(stock=5)
+
+        first = self.checkout(self.user, {casque: 1}, key='cle-commande-1')
+        second = self.checkout(self.user, {casque: 1}, key='cle-commande-2')
+
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(self.stock_of(casque), 3)
+
+    def test_same_key_is_scoped_to_the_customer(self):
+        casque = self.make_product(stock=5)
+
+        first = self.checkout(self.user, {casque: 1}, key='cle-commande-1')
+        other = self.checkout(self.other_user, {casque: 1}, key='cle-commande-1')
+
+        self.assertNotEqual(first.pk, other.pk)
+        self.assertFalse(other.replayed)
+
+    def test_double_submit_through_the_view(self):
+        casque = self.make_product(stock=5)
+        self.make_cart(self.user, {casque: 2})
+        self.client.force_login(self.user)
+        data = {
+            'shipping_address': '1 rue de Paris', 'billing_address': '1 rue de Paris',
+            'payment_method': 'paypal', 'notes': '', 'idempotency_key': 'cle-formulaire-1',
+        }
+
+        first = self.client.post(reverse('checkout'), data)
+        second = self.client.post(reverse('checkout'), data)
+
+        order = Order.objects.get()
+        self.assertRedirects(first, reverse('order_confirmation', args=[order.pk]), fetch_redirect_response=False)
+        self.assertRedirects(second, reverse('order_confirmation', args=[order.pk]), fetch_redirect_response=False)
+        self.assertEqual(self.stock_of(casque), 3)
+
+
+# ==================== CHANGEMENTS DE STATUT EN MASSE ====================
+
+class TransitionTests(ShopTestCase):
+
+    def make_orders(self, count, status='pending'):
+        start = Order.objects.count()
+        return Order.objects.bulk_create([
+            Order(
+                user=self.user, order_number=f'CMD-T-{start + i}', status=status, payment_method='paypal',
+                total_amount=Decimal('10.00'), shipping_address='1 rue', billing_address='1 rue',
+            )
+            for i in range(count)
+        ])
+
+    def test_orders_move_in_batches_with_history(self):
+        orders = self.make_orders(5)
+        batches = []
+
+        report = transition_orders(
+            Order.objects.all(), 'processing', batch_size=2, changed_by=self.user, source='test',
+            on_batch=lambda number, count: batches.append(count),
+        )
+
+        self.assertEqual(report.batches, [2, 2, 1])
+        self.assertEqual(batches, [2, 2, 1])
+        self.assertEqual(report.updated, 5)
+        self.assertEqual(report.skipped, 0)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'processing'})
+        history = OrderStatusHistory.objects.order_by('order_id')
+        self.assertEqual(
+            list(history.values_list('order_id', 'from_status', 'to_status', 'changed_by', 'source')),
+            [(order.pk, 'pending', 'processing', self.user.pk, 'test') for order in orders],
+        )
+        self.assertEqual(OutboxEvent.objects.filter(event_type='order.status_changed').count(), 5)
+
+    def test_invalid_transitions_are_skipped(self):
+        delivered = self.make_orders(2, status='delivered')
+        pending = self.make_orders(1)
+
+        report = transition_orders(Order.objects.all(), 'cancelled')
+
+        self.assertEqual(report.updated, 1)
+        self.assertEqual(report.skipped, 2)
+        self.assertEqual(Order.objects.get(pk=pending[0].pk).status, 'cancelled')
+        self.assertEqual(
+            set(Order.objects.filter(pk__in=[o.pk for o in delivered]).values_list('status', flat=True)),
+            {'delivered'},
+        )
+        self.assertEqual(list(OrderStatusHistory.objects.values_list('order_id', flat=True)), [pending[0].pk])
+
+    def test_signal_is_sent_after_each_batch_commits(self):
+        self.make_orders(3)
+        received = []
+
+        def receiver(sender, order_ids, previous, status, **kwargs):
+            received.append((len(order_ids), set(previous.values()), status))
+
+        order_status_changed.connect(receiver)
+        self.addCleanup(order_status_changed.disconnect, receiver)
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_orders(Order.objects.all(), 'processing', batch_size=2)
+
+        self.assertEqual(received, [(2, {'pending'}, 'processing'), (1, {'pending'}, 'processing')])
+
+    def test_unknown_status_is_rejected(self):
+        with self.assertRaises(ValueError):
+            allowed_sources('perdue')
+        with self.assertRaises(ValueError):
+            transition_orders(Order.objects.all(), 'perdue')
+
+
+# ==================== IMPORT DU CATALOGUE ====================
+
+class CatalogImportTests(ShopTestCase):
+
+    FIELDS = ['name', 'slug', 'category', 'price', 'discount_price', 'stock', 'brand']
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write_csv(self, rows, name='flux.csv'):
+        path = self.directory / name
+        with path.open('w', encoding='utf-8', newline='') as handle:
+            writer = csv.DictWriter(handle, fieldnames=self.FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def rows(self, count, stock=4):
+        return [
+            {
+                'name': f'Casque {i}', 'slug': f'casque-{i}', 'category': 'audio',
+                'price': '49.90', 'discount_price': '', 'stock': str(stock), 'brand': 'Sony',
+            }
+            for i in range(count)
+        ]
+
+    def test_reimport_is_idempotent(self):
+        path = self.write_csv(self.rows(5))
+
+        first = import_catalog(path, batch_size=2)
+        snapshot = list(Product.objects.order_by('slug').values('slug', 'name', 'price', 'stock', 'category'))
+        second = import_catalog(path, batch_size=2)
+
+        self.assertEqual((first.read, first.created, first.updated, first.errors), (5, 5, 0, []))
+        self.assertEqual((second.read, second.created, second.updated, second.errors), (5, 0, 5, []))
+        self.assertEqual(
+            list(Product.objects.order_by('slug').values('slug', 'name', 'price', 'stock', 'category')),
+            snapshot,
+        )
+
+    def test_reimport_updates_changed_rows_by_slug(self):
+        import_catalog(self.write_csv(self.rows(3)))
+        rows = self.rows(3, stock=9)
+        rows[1]['discount_price'] = '39.90'
+
+        report = import_catalog(self.write_csv(rows, 'flux-2.csv'))
+
+        self.assertEqual((report.created, report.updated), (0, 3))
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {9})
+        self.assertEqual(Product.objects.get(slug='casque-1').final_price, Decimal('39.90'))
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        rows = self.rows(3)
+        rows[0]['price'] = 'gratuit'
+        rows[1]['stock'] = '-2'
+        rows[2]['category'] = 'inconnue'
+
+        report = import_catalog(self.write_csv(rows))
+
+        self.assertEqual((report.read, report.created), (3, 0))
+        self.assertEqual(len(report.errors), 3)
+        self.assertFalse(Product.objects.exists())
+
+    def test_unknown_categories_can_be_created(self):
+        rows = self.rows(1)
+        rows[0]['category'] = 'gaming'
+
+        report = import_catalog(self.write_csv(rows), create_categories=True)
+
+        self.assertEqual(report.created, 1)
+        self.assertEqual(Product.objects.get().category.slug, 'gaming')
+
+    def test_dry_run_writes_nothing(self):
+        report = import_catalog(self.write_csv(self.rows(2)), dry_run=True)
+
+        self.assertEqual(report.created, 2)
+        self.assertFalse(Product.objects.exists())
+
+    def test_jsonl_feed(self):
+        path = self.directory / 'flux.jsonl'
+        path.write_text('\n'.join(json.dumps(row) for row in self.rows(2)) + '\n{pas du json\n', encoding='utf-8')
+
+        report = import_catalog(path)
 
-# Create your tests here.
+        self.assertEqual((report.read, report.created, len(report.errors)), (3, 2, 1))
@@ -6,6 +6,7 @@ Définit toutes les routes (URLs) de l'application e-commerce
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
+from .forms import QueuedPasswordResetForm
 
 urlpatterns = [
     # ========================
@@ -27,6 +28,9 @@ urlpatterns = [
     # Recherche avancée
     path('search/', views.search_view, name='search_view'),
     
+    # AJAX - Autocomplétion de la barre de recherche
+    path('search/autocomplete/', views.autocomplete, name='autocomplete'),
+    
     # ========================
     # PANIER D'ACHAT
     # ========================
@@ -43,6 +47,9 @@ urlpatterns = [
     # AJAX - Supprimer du panier (POST seulement)
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     
+    # AJAX - Plusieurs opérations en une requête (POST seulement)
+    path('cart/batch/', views.update_cart_batch, name='update_cart_batch'),
+    
     # ========================
     # COMMANDE ET PAIEMENT
     # ========================
@@ -68,7 +75,11 @@ urlpatterns = [
     
     # Mot de passe oublié (fonctionnalité future)
     path('password-reset/', 
-         auth_views.PasswordResetView.as_view(template_name='password_reset.html'), 
+         auth_views.PasswordResetView.as_view(
+             template_name='password_reset.html',
+             form_class=QueuedPasswordResetForm,
+             html_email_template_name='password_reset_email.html',
+         ), 
          name='password_reset'),
     
     path('password-reset/done/', 
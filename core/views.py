@@ -5,17 +5,21 @@ Vues pour l'application e-commerce
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.forms import AuthenticationForm, PasswordResetForm
+from django.contrib.auth.forms import AuthenticationForm
 from django.db.models.query_utils import Q
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.contrib import messages
-from django.db.models import Q
-from django.http import JsonResponse
+from django.db.models import Count, Prefetch, Q, Sum
+from django.db.models.functions import Coalesce
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
+import copy
+import uuid
 import json
+from decimal import Decimal, InvalidOperation
 from django.db import transaction
 import logging
 from .models import User  # User personnalisé
@@ -24,65 +28,163 @@ from django.views.decorators.csrf import ensure_csrf_cookie
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 # Import des modèles CORRECTS
-from .models import Product, Category, Cart, CartItem, Order
+from .models import Product, Category, Cart, CartItem, Order, OrderItem
 # IMPORTANT: On utilise UserProfile, pas Customer (si vous avez gardé UserProfile)
 # Si vous avez renommé en Customer, changez ici
 from .models import UserProfile
 
+from .pagination import KeysetPaginator, paginate_products
+from .search import get_search_backend
+from .facets import get_facets, normalize_filters
+from .autocomplete import autocomplete_service
+from .caching import catalog_key, get_catalog_version, get_or_compute
+from .categories import category_registry, get_category_or_404
+from .cart import (
+    CART_MAX_QUANTITY, CookieCart, apply_cart_operations, cart_item_total, cart_json,
+    get_cookie_cart, increment_cart_items, store_cart_count, summarize_cart,
+)
+from .checkout import CheckoutError, clean_idempotency_key, find_order_by_key, place_order
+from .customer_stats import get_customer_stats
+from .inventory import reserve_cart, with_available_stock
+
 # Import des forms CORRECTS
-from .forms import UserRegistrationForm, UserLoginForm, UserProfileForm, CheckoutForm, PasswordChangeCustomForm
+from .forms import (
+    UserRegistrationForm, UserLoginForm, UserProfileForm, CheckoutForm, PasswordChangeCustomForm,
+    QueuedPasswordResetForm,
+)
+from .jobs import enqueue
 
 # Configuration du logging
 logger = logging.getLogger(__name__)
 
+HOME_CACHE_TIMEOUT = 600
+
+# Commandes par page dans l'historique client
+ORDERS_PER_PAGE = 20
+
+
+def build_home_context():
+    """Calcule le contenu de la page d'accueil (trois requêtes)"""
+    return {
+        'categories': category_registry.all(),
+        'featured_products': list(Product.objects.filter(is_available=True)[:8]),
+        'discounted_products': list(Product.objects.filter(
+            discount_price__isnull=False, 
+            is_available=True
+        )[:4]),
+    }
+
+
 def home(request):
-    """Vue pour la page d'accueil"""
-    categories = Category.objects.all()
-    featured_products = Product.objects.filter(is_available=True)[:8]
-    discounted_products = Product.objects.filter(
-        discount_price__isnull=False, 
-        is_available=True
-    )[:4]
+    """Vue pour la page d'accueil (contexte et fragments en cache, voir core.caching)"""
+    context = dict(get_or_compute(
+        catalog_key('home', 'context'),
+        build_home_context,
+        HOME_CACHE_TIMEOUT,
+        stale_key='home:context:last',
+    ))
+    # Disponibilité relue à chaque affichage (une requête) : réservations,
+    # paiements et annulations ne changent pas la version du catalogue
+    product_ids = [product.id for product in context['featured_products'] + context['discounted_products']]
+    in_stock_ids = sorted(
+        with_available_stock(Product.objects.filter(id__in=product_ids))
+        .filter(available_stock__gt=0)
+        .values_list('id', flat=True)
+    )
+    context['in_stock_ids'] = set(in_stock_ids)
+    # Clés utilisées par les {% cache %} de home.html
+    context['catalog_version'] = get_catalog_version()
+    context['stock_key'] = ','.join(map(str, in_stock_ids))
+    context['home_cache_timeout'] = HOME_CACHE_TIMEOUT
     
-    context = {
+    return render(request, 'home.html', context)
+
+
+def filter_products(products, params):
+    """Applique les filtres marque / prix / stock communs aux listes de produits"""
+    brand = params.get('brand', '')
+    if brand:
+        products = products.filter(brand__iexact=brand)
+    
+    for param, lookup in (('min_price', 'final_price__gte'), ('max_price', 'final_price__lte')):
+        value = params.get(param, '')
+        if value:
+            try:
+                products = products.filter(**{lookup: Decimal(value)})
+            except InvalidOperation:
+                pass
+    
+    if params.get('in_stock'):
+        products = products.filter(stock__gt=0)
+    return products
+
+
+def listing_facets(request, products, facet_base, categories, category_slug=None):
+    """
+    Contexte des facettes de la barre latérale (catégories, marques, prix)
+
+    `facet_base` est le queryset filtré sans le filtre de catégorie, pour
+    compter les produits de chaque catégorie.
+    """
+    facets = get_facets(
+        products,
+        normalize_filters(request.GET, category=category_slug or ''),
+        category_queryset=facet_base,
+    )
+    # Copies : les catégories du registre sont partagées entre les requêtes
+    categories = [copy.copy(cat) for cat in categories]
+    for cat in categories:
+        cat.facet_count = facets['categories'].get(cat.id, 0)
+    
+    return {
         'categories': categories,
-        'featured_products': featured_products,
-        'discounted_products': discounted_products,
+        'facets': facets,
+        'brands': [row['brand'] for row in facets['brands']],
+        'price_buckets': facets['price_buckets'],
+        'total_products': sum(facets['categories'].values()),
+        'brand': request.GET.get('brand', ''),
+        'min_price': request.GET.get('min_price', ''),
+        'max_price': request.GET.get('max_price', ''),
     }
-    
-    return render(request, 'home.html', context)
 
 
 def product_list(request, category_slug=None):
     """Vue pour afficher la liste des produits avec recherche et filtrage"""
     
     # Initialiser les variables
-    products = Product.objects.filter(is_available=True)
+    products = Product.objects.filter(is_available=True).select_related('category')
     category = None
     query = request.GET.get('q', '')  # Récupérer le terme de recherche
     
+    # Recherche par terme (index plein texte)
+    if query:
+        products = get_search_backend().search(products, query)
+    
+    # Filtres marque / prix / stock
+    products = filter_products(products, request.GET)
+    facet_base = products
+    
     # Filtrage par catégorie
     if category_slug:
-        category = get_object_or_404(Category, slug=category_slug)
+        category = get_category_or_404(category_slug)
         products = products.filter(category=category)
     
-    # Recherche par terme
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__name__icontains=query)
-        ).distinct()
+    # Pagination - 12 produits par page
+    paginator, products_page = paginate_products(request, products, 'newest', annotate=with_available_stock)
     
     # Récupérer toutes les catégories pour le menu
-    categories = Category.objects.all()
+    categories = category_registry.all()
     
     context = {
-        'products': products,
+        'products': products_page,
         'category': category,
         'categories': categories,
         'query': query,
+        'page_obj': products_page,
+        'paginator': paginator,
+        'is_paginated': products_page.has_other_pages(),
     }
+    context.update(listing_facets(request, products, facet_base, categories, category_slug))
     
     return render(request, 'product_list.html', context)
 
@@ -93,24 +195,22 @@ def product_list_by_category(request, category_slug):
     Affiche les produits d'une catégorie spécifique avec pagination
     """
     # Récupérer la catégorie
-    category = get_object_or_404(Category, slug=category_slug)
+    category = get_category_or_404(category_slug)
     
     # Récupérer le terme de recherche
     query = request.GET.get('q', '')
     
     # Base queryset
-    products = Product.objects.filter(
-        category=category,
-        is_available=True
-    )
+    products = Product.objects.filter(is_available=True).select_related('category')
     
-    # Recherche
+    # Recherche (index plein texte)
     if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(brand__icontains=query)
-        ).distinct()
+        products = get_search_backend().search(products, query)
+    
+    # Filtres marque / prix / stock, puis catégorie
+    products = filter_products(products, request.GET)
+    facet_base = products
+    products = products.filter(category=category)
     
     # Tri
     sort_by = request.GET.get('sort', 'newest')
@@ -126,19 +226,11 @@ def product_list_by_category(request, category_slug):
     else:  # 'newest' par défaut
         products = products.order_by('-created_at')
     
-    # Pagination - 12 produits par page
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page', 1)
-    
-    try:
-        products_page = paginator.page(page)
-    except PageNotAnInteger:
-        products_page = paginator.page(1)
-    except EmptyPage:
-        products_page = paginator.page(paginator.num_pages)
+    # Pagination - 12 produits par page (par curseur si activée)
+    paginator, products_page = paginate_products(request, products, sort_by, annotate=with_available_stock)
     
     # Données pour le template
-    categories = Category.objects.all()
+    categories = category_registry.all()
     
     # Sous-catégories (si vous en avez)
     # subcategories = category.subcategories.all()  # Si vous avez un champ parent
@@ -151,17 +243,21 @@ def product_list_by_category(request, category_slug):
         'sort_by': sort_by,
         'page_obj': products_page,  # Pour la pagination
         'paginator': paginator,
-        'is_paginated': paginator.num_pages > 1,
-        'product_count': products.count(),
+        'is_paginated': products_page.has_other_pages(),
+        'product_count': paginator.count,
         # 'subcategories': subcategories,  # Si vous avez des sous-catégories
     }
+    context.update(listing_facets(request, products, facet_base, categories, category_slug))
     
     return render(request, 'product_list.html', context)
 
 
 def product_detail(request, slug):
     """Vue pour les détails d'un produit"""
-    product = get_object_or_404(Product, slug=slug, is_available=True)
+    product = get_object_or_404(
+        with_available_stock(Product.objects.select_related('category')),
+        slug=slug, is_available=True,
+    )
     related_products = Product.objects.filter(
         category=product.category, 
         is_available=True
@@ -177,27 +273,21 @@ def get_or_create_cart(request):
     """
     Récupère ou crée un panier pour l'utilisateur
     Gère à la fois les utilisateurs authentifiés et les visiteurs anonymes
+
+    Les visiteurs anonymes reçoivent un panier CookieCart (cookie signé) :
+    aucune session ni ligne Cart n'est créée avant la connexion.
     """
     if request.user.is_authenticated:
         cart, created = Cart.objects.get_or_create(user=request.user)
-    else:
-        session_key = request.session.session_key
-        if not session_key:
-            request.session.create()
-            session_key = request.session.session_key
-        
-        cart, created = Cart.objects.get_or_create(
-            session_key=session_key,
-            user=None
-        )
-    return cart
+        return cart
+    return get_cookie_cart(request)
 
 def cart_view(request):
     """Vue pour afficher le panier"""
     cart = get_or_create_cart(request)
     
     context = {
-        'cart': cart,
+        'cart': summarize_cart(cart),
     }
     return render(request, 'cart.html', context)
 
@@ -207,66 +297,107 @@ def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id, is_available=True)
     cart = get_or_create_cart(request)
     
-    # Vérifie si le produit est déjà dans le panier
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': 1}
-    )
+    if isinstance(cart, CookieCart):
+        if not cart.add(product.id):
+            return JsonResponse({'success': False, 'error': 'Panier plein'})
+    else:
+        # Upsert atomique : les clics concurrents s'additionnent
+        increment_cart_items(cart, {product.id: 1})
     
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    totals = cart_json(request, cart)
     
     return JsonResponse({
         'success': True,
         'message': f'{product.name} ajouté au panier',
-        'cart_total': cart.total_items,
+        'cart_total': totals['cart_item_count'],
+        'cart_item_count': totals['cart_item_count'],
     })
 
 @require_POST
 def update_cart_item(request, item_id):
-    """Met à jour la quantité d'un article dans le panier (AJAX)"""
-    cart_item = get_object_or_404(CartItem, id=item_id)
+    """
+    Met à jour la quantité d'un article dans le panier (AJAX)
+    Pour un panier anonyme, `item_id` est l'id du produit
+    """
+    cart = get_or_create_cart(request)
     
     try:
         data = json.loads(request.body)
         quantity = int(data.get('quantity', 1))
-        
-        if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
-            
-            return JsonResponse({
-                'success': True,
-                'total_price': cart_item.total_price,
-                'cart_total': cart_item.cart.total_price,
-            })
-        else:
-            cart_item.delete()
-            return JsonResponse({
-                'success': True,
-                'deleted': True,
-                'cart_total': cart_item.cart.total_price,
-            })
     except (ValueError, json.JSONDecodeError):
         return JsonResponse({'success': False, 'error': 'Données invalides'})
+    
+    if isinstance(cart, CookieCart):
+        if not cart.set_quantity(item_id, quantity):
+            raise Http404("Article introuvable dans le panier.")
+        item = next((item for item in cart.items if item.id == item_id), None)
+        item_total = item.total_price if item else 0
+    else:
+        items = CartItem.objects.filter(id=item_id, cart=cart)
+        if quantity > 0:
+            found = items.update(quantity=min(quantity, CART_MAX_QUANTITY))
+        else:
+            found, _deleted = items.delete()
+        if not found:
+            raise Http404("Article introuvable dans le panier.")
+        if quantity > 0:
+            item_total = cart_item_total(cart, item_id)
+    
+    response = {'success': True, **cart_json(request, cart)}
+    if quantity > 0:
+        response['total_price'] = item_total
+    else:
+        response['deleted'] = True
+    return JsonResponse(response)
 
 @require_POST
 def remove_from_cart(request, item_id):
-    """Supprime un article du panier (AJAX)"""
-    cart_item = get_object_or_404(CartItem, id=item_id)
-    cart_item.delete()
+    """
+    Supprime un article du panier (AJAX)
+    Pour un panier anonyme, `item_id` est l'id du produit
+    """
+    cart = get_or_create_cart(request)
     
-    return JsonResponse({
-        'success': True,
-        'cart_total': cart_item.cart.total_price,
-    })
+    if isinstance(cart, CookieCart):
+        if not cart.remove(item_id):
+            raise Http404("Article introuvable dans le panier.")
+    else:
+        deleted, _details = CartItem.objects.filter(id=item_id, cart=cart).delete()
+        if not deleted:
+            raise Http404("Article introuvable dans le panier.")
+    
+    return JsonResponse({'success': True, **cart_json(request, cart)})
+
+@require_POST
+def update_cart_batch(request):
+    """
+    Applique plusieurs opérations au panier en une requête et une transaction (AJAX)
+    Corps : {"operations": [{"op": "add"|"set"|"remove", "product_id": 1, "quantity": 2}, ...]}
+    """
+    cart = get_or_create_cart(request)
+    
+    try:
+        data = json.loads(request.body)
+        apply_cart_operations(cart, data.get('operations'))
+    except (ValueError, AttributeError):  # JSON invalide ou InvalidCartOperation
+        return JsonResponse({'success': False, 'error': 'Données invalides'}, status=400)
+    
+    return JsonResponse({'success': True, **cart_json(request, cart)})
 
 @login_required
 def checkout(request):
     """Vue pour le processus de paiement"""
-    cart = get_or_create_cart(request)
+    # Clé d'idempotence : champ caché du formulaire ou en-tête Idempotency-Key
+    idempotency_key = clean_idempotency_key(
+        request.POST.get('idempotency_key') or request.headers.get('Idempotency-Key')
+    )
+    if request.method == 'POST':
+        # Soumission répétée d'une commande déjà passée : on la rejoue
+        previous = find_order_by_key(request.user, idempotency_key)
+        if previous is not None:
+            return redirect('order_confirmation', order_id=previous.id)
+    
+    cart = summarize_cart(get_or_create_cart(request))
     
     if cart.total_items == 0:
         messages.warning(request, "Votre panier est vide")
@@ -275,24 +406,19 @@ def checkout(request):
     if request.method == 'POST':
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            # Créer la commande
+            # Créer la commande (stock verrouillé et décrémenté en une transaction)
             order = form.save(commit=False)
             order.user = request.user
-            order.total_amount = cart.total_price
-            order.save()
-            
-            # Créer les articles de commande
-            for cart_item in cart.items.all():
-                order_item = order.items.create(
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.final_price
-                )
-            
-            # Vider le panier
-            cart.items.all().delete()
+            order.idempotency_key = idempotency_key
+            try:
+                order = place_order(cart.cart, order)
+            except CheckoutError as exc:
+                messages.error(request, str(exc))
+                return redirect('cart')
+            store_cart_count(request, 0)
             
-            messages.success(request, "Votre commande a été passée avec succès!")
+            if not order.replayed:
+                messages.success(request, "Votre commande a été passée avec succès!")
             return redirect('order_confirmation', order_id=order.id)
     else:
         # Pré-remplir le formulaire avec les informations du profil
@@ -310,9 +436,20 @@ def checkout(request):
         
         form = CheckoutForm(initial=initial_data)
     
+    # Réserve le stock du panier le temps du paiement (prolongé à chaque affichage)
+    reservation = reserve_cart(cart.cart)
+    if not reservation:
+        messages.warning(
+            request,
+            "Stock insuffisant pour : " + ', '.join(reservation.shortages) +
+            ". Ces articles ne sont pas réservés."
+        )
+    
     context = {
         'cart': cart,
         'form': form,
+        'reservation_expires_at': reservation.expires_at,
+        'idempotency_key': idempotency_key or uuid.uuid4().hex,
     }
     return render(request, 'checkout.html', context)
 
@@ -383,6 +520,9 @@ def user_register(request):
                         newsletter_subscription=form.cleaned_data.get('newsletter_subscription', True)
                     )
                     
+                    # Email de bienvenue envoyé en tâche de fond après le commit
+                    enqueue('send_welcome_email', user_id=user.id)
+                    
                     # Connecter automatiquement l'utilisateur
                     login(request, user)
                     
@@ -431,14 +571,13 @@ def user_profile(request):
         # Créer un profil si inexistant
         profile = UserProfile.objects.create(user=request.user)  # Ou Customer.objects.create
     
-    # Récupérer les commandes de l'utilisateur
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')[:5]
+    # Récupérer les dernières commandes de l'utilisateur
+    orders = Order.objects.filter(user=request.user).only(
+        'id', 'order_number', 'status', 'total_amount', 'created_at',
+    ).order_by('-created_at', '-id')[:5]
     
-    # Calculer les dépenses totales
-    total_spent = Order.objects.filter(
-        user=request.user, 
-        status='delivered'
-    ).aggregate(total=models.Sum('total_amount'))['total'] or 0
+    # Statistiques matérialisées (une ligne lue par clé primaire)
+    stats = get_customer_stats(request.user)
     
     if request.method == 'POST':
         # Vérifier quel formulaire est soumis
@@ -482,7 +621,8 @@ def user_profile(request):
         'form': form,
         'password_form': password_form,
         'orders': orders,
-        'total_spent': total_spent
+        'stats': stats,
+        'total_spent': stats.lifetime_spend,
     }
     
     return render(request, 'profile.html', context)
@@ -500,25 +640,18 @@ def search_view(request):
     # Initialiser le queryset
     products = Product.objects.filter(is_available=True)
     
-    # Recherche par texte
+    # Recherche par texte (index plein texte, annoté avec search_rank)
     if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(brand__icontains=query) |
-            Q(category__name__icontains=query)
-        ).distinct()
+        products = get_search_backend().search(products, query)
     
     # Filtre par catégorie
     selected_category = None
     selected_category_name = ''
     if category_slug:
-        try:
-            selected_category = Category.objects.get(slug=category_slug)
+        selected_category = category_registry.get_by_slug(category_slug)
+        if selected_category is not None:
             products = products.filter(category=selected_category)
             selected_category_name = selected_category.name
-        except Category.DoesNotExist:
-            pass
     
     # Filtre par prix minimum
     if min_price:
@@ -550,15 +683,24 @@ def search_view(request):
     elif sort == 'name':
         products = products.order_by('name')
     else:  # 'relevance'
-        # Par défaut: plus récents d'abord si pas de recherche texte
-        if not query:
+        # Score pondéré nom/marque/catégorie/description, sinon plus récents d'abord
+        if query:
+            products = products.order_by('-search_rank', '-id')
+        else:
             products = products.order_by('-created_at')
     
+    # Pagination - 12 produits par page ; le tri par pertinence reste paginé par OFFSET
+    pagination_sort = 'newest' if sort == 'relevance' and not query else sort
+    paginator, products_page = paginate_products(request, products, pagination_sort, annotate=with_available_stock)
+    
     # Récupérer toutes les catégories pour le select
-    categories = Category.objects.all()
+    categories = category_registry.all()
     
     context = {
-        'products': products,
+        'products': products_page,
+        'page_obj': products_page,
+        'paginator': paginator,
+        'is_paginated': products_page.has_other_pages(),
         'categories': categories,
         'query': query,
         'selected_category': category_slug,
@@ -570,10 +712,36 @@ def search_view(request):
     }
     
     return render(request, 'search.html', context)
+def autocomplete(request):
+    """Suggestions de recherche (produits, marques, catégories) en JSON"""
+    query = request.GET.get('q', '')[:100]
+    try:
+        limit = min(int(request.GET.get('limit', 8)), 20)
+    except ValueError:
+        limit = 8
+    
+    return JsonResponse({
+        'query': query,
+        'results': autocomplete_service.complete(query, limit) if query else [],
+    })
+
+def order_with_items(user, order_id):
+    """
+    Commande de l'utilisateur avec ses lignes et leurs produits préchargés
+    (deux requêtes, colonnes limitées à ce qu'affichent les templates)
+    """
+    items = OrderItem.objects.select_related('product').only(
+        'id', 'order_id', 'quantity', 'price', 'product__id', 'product__name', 'product__slug',
+    ).order_by('id')
+    return get_object_or_404(
+        Order.objects.prefetch_related(Prefetch('items', queryset=items)),
+        id=order_id, user=user,
+    )
+
 @login_required
 def order_confirmation(request, order_id):
     """Vue pour la confirmation de commande"""
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    order = order_with_items(request.user, order_id)
     
     context = {
         'order': order,
@@ -582,18 +750,30 @@ def order_confirmation(request, order_id):
 
 @login_required
 def user_orders(request):
-    """Vue pour l'historique des commandes"""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    """
+    Vue pour l'historique des commandes
+    Pagination par curseur ; nombre d'articles et montant des lignes calculés en SQL
+    """
+    orders = Order.objects.filter(user=request.user).only(
+        'id', 'order_number', 'status', 'total_amount', 'created_at',
+    ).annotate(
+        item_count=Coalesce(Sum('items__quantity'), 0),
+        line_count=Count('items'),
+    )
+    
+    # Pas de cache du total : il change à chaque commande de l'utilisateur
+    paginator = KeysetPaginator(orders, ORDERS_PER_PAGE, ('-created_at', '-id'), count_timeout=0)
+    orders_page = paginator.get_page(request.GET.get('page'), request.GET.get('cursor'))
     
     context = {
-        'orders': orders,
+        'orders': orders_page,
     }
     return render(request, 'user_orders.html', context)
 
 @login_required
 def order_detail(request, order_id):
     """Vue pour le détail d'une commande"""
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    order = order_with_items(request.user, order_id)
     
     context = {
         'order': order,
@@ -605,30 +785,18 @@ def static_page(request, template_name):
     return render(request, template_name)
 
 def password_reset_request(request):
-    """Vue pour la réinitialisation du mot de passe"""
+    """Vue pour la réinitialisation du mot de passe (l'email part en tâche de fond)"""
     if request.method == "POST":
-        form = PasswordResetForm(request.POST)
+        form = QueuedPasswordResetForm(request.POST)
         if form.is_valid():
-            data = form.cleaned_data['email']
-            associated_users = User.objects.filter(Q(email=data))
-            if associated_users.exists():
-                for user in associated_users:
-                    # Envoyer l'email de réinitialisation
-                    subject = "Réinitialisation du mot de passe - Nexus Shop"
-                    email_template_name = "password_reset_email.txt"
-                    context = {
-                        'email': user.email,
-                        'domain': request.get_host(),
-                        'site_name': 'Nexus Shop',
-                        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
-                        'user': user,
-                        'token': default_token_generator.make_token(user),
-                        'protocol': 'http',
-                    }
-                    # Ici vous enverriez l'email normalement
-                    messages.info(request, "Un email de réinitialisation a été envoyé.")
-                    return redirect("password_reset_done")
+            form.save(
+                request=request,
+                use_https=request.is_secure(),
+                html_email_template_name='password_reset_email.html',
+            )
+            messages.info(request, "Un email de réinitialisation a été envoyé.")
+            return redirect("password_reset_done")
     else:
-        form = PasswordResetForm()
+        form = QueuedPasswordResetForm()
     
     return render(request, 'password_reset.html', {'form': form})
\ No newline at end of file
@@ -62,6 +62,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.CookieCartMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -79,6 +80,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.cart_item_count',
+                'core.context_processors.categories',
                 'core.context_processors.admin_stats',
             ],
         },
@@ -144,6 +146,16 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# Cache
+# En production, utiliser un cache partagé (Redis/Memcached) : les versions
+# du catalogue et des catégories y coordonnent tous les workers.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='nexus-shop'),
+    }
+}
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -160,7 +172,9 @@ LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
 
 # Session configuration for cart
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# cached_db : la session (et le badge du panier qu'elle contient) est lue
+# depuis le cache, la base ne sert que de stockage durable
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
 
 
@@ -168,7 +182,7 @@ SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
 SESSION_COOKIE_SECURE = False  # False pour développement
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = 'Lax'
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # Assurez-vous que c'est 'db'
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'  # 'db' + cache en lecture
 SESSION_COOKIE_NAME = 'sessionid'
 SESSION_COOKIE_AGE = 1209600  # 2 semaines en secondes
 
@@ -193,4 +207,55 @@ CSRF_HEADER_NAME = 'HTTP_X_CSRFTOKEN'
 CSRF_TRUSTED_ORIGINS = [
     'http://localhost:8000',
     'http://127.0.0.1:8000',
-]
\ No newline at end of file
+]
+
+# ==================== CATALOGUE ====================
+
+# Pagination par curseur (keyset) des listes de produits et de la recherche
+CATALOG_KEYSET_PAGINATION = config('CATALOG_KEYSET_PAGINATION', default=False, cast=bool)
+# Durée de cache du nombre total de résultats (secondes)
+KEYSET_COUNT_CACHE_TIMEOUT = 300
+# Âge maximal du registre des catégories d'un processus (secondes, core.categories)
+CATEGORY_REGISTRY_TTL = config('CATEGORY_REGISTRY_TTL', default=60, cast=int)
+# Âge maximal de l'index d'autocomplétion d'un processus (secondes, core.autocomplete)
+AUTOCOMPLETE_INDEX_TTL = config('AUTOCOMPLETE_INDEX_TTL', default=300, cast=int)
+
+# ==================== COMMANDES ====================
+
+# Attente maximale d'un verrou produit pendant le passage de commande (ms, PostgreSQL)
+CHECKOUT_LOCK_TIMEOUT = config('CHECKOUT_LOCK_TIMEOUT', default=3000, cast=int)
+# Durée de réservation du stock d'un panier entré dans le paiement (secondes)
+RESERVATION_TTL = config('RESERVATION_TTL', default=15 * 60, cast=int)
+# Numéros de commande réservés par bloc et par processus (core.order_numbers)
+ORDER_NUMBER_BLOCK_SIZE = config('ORDER_NUMBER_BLOCK_SIZE', default=50, cast=int)
+# Commandes changées de statut par transaction (core.order_status)
+ORDER_TRANSITION_BATCH_SIZE = config('ORDER_TRANSITION_BATCH_SIZE', default=500, cast=int)
+
+# ==================== TÂCHES D'ARRIÈRE-PLAN ====================
+
+# Délai de la première nouvelle tentative, doublé à chaque échec (secondes)
+JOB_RETRY_BASE_DELAY = 10
+JOB_RETRY_MAX_DELAY = 3600
+# Une tâche « en cours » depuis plus longtemps est reprise par un autre worker
+JOB_LOCK_TIMEOUT = 600
+# Seuil d'alerte de stock bas (tâche notify_low_stock)
+LOW_STOCK_THRESHOLD = config('LOW_STOCK_THRESHOLD', default=5, cast=int)
+
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='Nexus Shop <noreply@nexus-shop.local>')
+ADMINS = [('Nexus Shop', config('ADMIN_EMAIL', default='admin@nexus-shop.local'))]
+
+# ==================== OUTBOX (ÉVÉNEMENTS DE COMMANDE) ====================
+
+# Destinataire des événements relayés par `relay_outbox` (core.outbox)
+OUTBOX_SINK = config('OUTBOX_SINK', default='core.outbox.LogSink')
+OUTBOX_SINK_OPTIONS = {}
+# Bail d'un lot en cours d'envoi : passé ce délai, un autre relais peut le reprendre (secondes)
+OUTBOX_CLAIM_TIMEOUT = config('OUTBOX_CLAIM_TIMEOUT', default=300, cast=int)
+
+# ==================== TABLEAU DE BORD ADMIN ====================
+
+# Âge maximal de l'instantané des statistiques avant recalcul en arrière-plan (secondes)
+ADMIN_STATS_MAX_AGE = 300
+# Période affichée par défaut sur la page des ventes (jours)
+SALES_DASHBOARD_DAYS = 30
@@ -172,16 +172,22 @@ $(document).ready(function() {
         $(this).removeClass('shadow-lg');
     });
     
-    // Gestion de la recherche en temps réel (optionnel)
+    // Autocomplétion de la barre de recherche
     let searchTimer;
     $('#search-input').on('input', function() {
         clearTimeout(searchTimer);
-        const query = $(this).val();
+        const $input = $(this);
+        const query = $input.val();
         
-        if (query.length >= 3) {
+        if (query.length >= 2) {
             searchTimer = setTimeout(() => {
-                performLiveSearch(query);
-            }, 500);
+                $.getJSON($input.data('autocomplete-url'), { q: query }, function(response) {
+                    const $list = $('#search-suggestions').empty();
+                    response.results.forEach(function(result) {
+                        $list.append($('<option>').attr('value', result.label));
+                    });
+                });
+            }, 150);
         }
     });
     